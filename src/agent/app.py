@@ -1,10 +1,18 @@
 import os
+import gzip
+import json
 import logging
 import asyncio
 import subprocess
 import httpx
 import re
+from collections import Counter
 from quart import Quart, request, jsonify
+from repair_queue import RepairQueue, QueueFull
+from repair_cache import RepairCache
+from good_corpus import GoodCorpus
+from sandbox import run_in_sandbox
+from transform_store import TransformStore
 
 app = Quart(__name__)
 
@@ -15,31 +23,123 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - AGENT - %(levelnam
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://host.docker.internal:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3") # Hoặc 'mistral', 'phi3'
 ETL_CONTAINER_NAME = os.getenv("ETL_CONTAINER_NAME", "etl") # Tên service trong docker-compose
-FUNCTION_FILE_PATH = "/app/function.py" # Đường dẫn file code được mount vào Agent
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 120))
+# Giữ model trong RAM giữa các lần sửa để không phải load lại model (rất chậm trên CPU)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEPALIVE_INTERVAL = int(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", 240)) # giây, 0 để tắt
+FUNCTION_FILE_PATH = "/app/function.py" # Đường dẫn file code được mount vào Agent (phiên bản khởi đầu)
+# Kho phiên bản transform dùng chung với ETL (ETL theo dõi file CURRENT trong kho)
+TRANSFORM_STORE_PATH = os.getenv("TRANSFORM_STORE_PATH", "transforms")
+transform_store = TransformStore(TRANSFORM_STORE_PATH)
+# Kho của từng route (ETL chạy nhiều loại message): <TRANSFORM_STORE_PATH>/<route>
+route_stores = {}
 
-# Lock để tránh 2 lỗi xảy ra cùng lúc làm Agent loạn
-processing_lock = asyncio.Lock()
+# Hàng đợi sửa lỗi: giới hạn số job chờ và số payload gom vào một prompt
+REPAIR_QUEUE_SIZE = int(os.getenv("REPAIR_QUEUE_SIZE", 16))
+REPAIR_MAX_EXAMPLES = int(os.getenv("REPAIR_MAX_EXAMPLES", 3))
+
+# Cache các bản sửa đã kiểm chứng (giữ qua restart nếu thư mục được mount volume)
+REPAIR_CACHE_DIR = os.getenv("REPAIR_CACHE_DIR", "cache/repairs")
+REPAIR_CACHE_SIZE = int(os.getenv("REPAIR_CACHE_SIZE", 256))
+repair_cache = RepairCache(REPAIR_CACHE_DIR, max_entries=REPAIR_CACHE_SIZE)
+
+# Sinh nhiều bản sửa song song (mỗi temperature một bản), chạy thử từng bản trong
+# sandbox trên payload lỗi + corpus payload tốt, rồi chọn bản đúng và nhanh nhất.
+# Ollama chỉ xử lý song song thật sự khi server bật OLLAMA_NUM_PARALLEL > 1.
+REPAIR_TEMPERATURES = [float(t) for t in os.getenv("REPAIR_TEMPERATURES", "0.2,0.5,0.8").split(",") if t.strip()]
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", 10))
+SANDBOX_REPEAT = int(os.getenv("SANDBOX_REPEAT", 5))
+GOOD_CORPUS_PATH = os.getenv("GOOD_CORPUS_PATH", "cache/good_corpus.jsonl")
+GOOD_CORPUS_SIZE = int(os.getenv("GOOD_CORPUS_SIZE", 200))
+good_corpus = GoodCorpus(GOOD_CORPUS_PATH, max_records=GOOD_CORPUS_SIZE)
+route_corpora = {}
+
+# HTTP client dùng chung cho mọi request tới Ollama (giữ connection pool)
+ollama_client = None
 
 # --- HELPER FUNCTIONS ---
 
-def read_current_code():
-    """Đọc nội dung file function.py hiện tại."""
+def get_ollama_client():
+    global ollama_client
+    if ollama_client is None:
+        ollama_client = httpx.AsyncClient(timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=5.0))
+    return ollama_client
+
+async def preload_model():
+    """
+    Gửi request không có prompt để Ollama load model và giữ nó trong RAM
+    thêm OLLAMA_KEEP_ALIVE, nhờ vậy lần sửa lỗi tiếp theo không bị cold start.
+    """
+    try:
+        response = await get_ollama_client().post(
+            OLLAMA_URL,
+            json={"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE}
+        )
+        response.raise_for_status()
+        logging.info(f"Ollama model {OLLAMA_MODEL} is loaded (keep_alive={OLLAMA_KEEP_ALIVE}).")
+    except Exception as e:
+        logging.warning(f"Failed to preload Ollama model: {e}")
+
+async def keep_model_warm():
+    while True:
+        await preload_model()
+        await asyncio.sleep(OLLAMA_KEEPALIVE_INTERVAL)
+
+def seed_transform_store():
+    """Lần chạy đầu tiên: đưa function.py vào kho làm phiên bản khởi đầu."""
+    if transform_store.current():
+        return
     try:
         with open(FUNCTION_FILE_PATH, "r") as f:
-            return f.read()
+            version = transform_store.publish(f.read(), origin="seed")
+        logging.info(f"Transform store seeded from function.py (version {version}).")
     except Exception as e:
-        logging.error(f"Failed to read function file: {e}")
+        logging.error(f"Failed to seed transform store: {e}")
+
+def get_transform_store(route=None):
+    """Kho phiên bản của một route, route None là kho mặc định (một transform duy nhất)."""
+    if not route:
+        return transform_store
+    # Tên route là tên thư mục con trong kho mặc định, không được trùng "versions" hay "CURRENT"
+    if not re.fullmatch(r"[\w-]+", route) or route in ("versions", "CURRENT"):
+        raise ValueError(f"Invalid route '{route}'")
+    if route not in route_stores:
+        route_stores[route] = TransformStore(os.path.join(TRANSFORM_STORE_PATH, route))
+    return route_stores[route]
+
+def get_good_corpus(route=None):
+    """Corpus payload tốt của một route (mỗi route có schema đầu vào riêng)."""
+    if not route:
+        return good_corpus
+    if route not in route_corpora:
+        path = os.path.splitext(GOOD_CORPUS_PATH)[0] + f".{route}.jsonl"
+        route_corpora[route] = GoodCorpus(path, max_records=GOOD_CORPUS_SIZE)
+    return route_corpora[route]
+
+def read_current_code(store):
+    """Đọc source của phiên bản transform đang chạy."""
+    try:
+        return store.read_source()
+    except Exception as e:
+        logging.error(f"Failed to read current transform version: {e}")
         return ""
 
-def write_new_code(code_content):
-    """Ghi đè code mới vào file."""
+def write_new_code(store, code_content, origin, **metadata):
+    """
+    Lưu code mới thành một phiên bản trong kho và chuyển CURRENT sang phiên bản đó.
+    ETL phát hiện CURRENT đổi và nạp bytecode đã compile sẵn ở message tiếp theo.
+    """
     try:
-        with open(FUNCTION_FILE_PATH, "w") as f:
-            f.write(code_content)
-        logging.info("File function.py has been updated.")
+        version = store.publish(
+            code_content,
+            origin=origin,
+            parent=store.current(),
+            **metadata
+        )
+        logging.info(f"Transform version {version} has been deployed.")
         return True
     except Exception as e:
-        logging.error(f"Failed to write function file: {e}")
+        logging.error(f"Failed to publish transform version: {e}")
         return False
 
 def extract_python_code(llm_response: str):
@@ -55,15 +155,83 @@ def extract_python_code(llm_response: str):
     # Nếu không có markdown, trả về nguyên gốc (có thể model trả code trần)
     return llm_response.strip()
 
-async def call_ollama_to_fix(error_msg, traceback_str, bad_code, payload):
-    """Gửi Prompt tới Ollama."""
+async def read_report():
+    """
+    Đọc báo lỗi từ ETL. Body có thể được gzip (Content-Encoding: gzip)
+    khi payload lớn, nên không dùng trực tiếp request.get_json().
+    """
+    body = await request.get_data()
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+def format_schema_diff(schema_diff):
+    """Diễn giải schema diff thành vài dòng ngắn cho prompt."""
+    if not schema_diff:
+        return "(not available)"
+    if not schema_diff.get("known_good"):
+        return f"No known-good schema yet. Current input schema: {json.dumps(schema_diff.get('current', {}))}"
+
+    lines = []
+    for key, type_ in schema_diff.get("added", {}).items():
+        lines.append(f"+ {key}: {type_} (new field)")
+    for key, type_ in schema_diff.get("removed", {}).items():
+        lines.append(f"- {key}: {type_} (missing field)")
+    for key, (old, new) in schema_diff.get("type_changed", {}).items():
+        lines.append(f"~ {key}: {old} -> {new}")
+    return "\n    ".join(lines) or "No key or type change against the last good input."
+
+async def expected_output_keys(current_code, corpus):
+    """
+    Schema đầu ra hiện tại: tập key phổ biến nhất khi chạy code hiện tại trên corpus.
+    Bản sửa không được phép thay đổi schema này. None nếu chưa xác định được.
+    """
+    if not corpus:
+        return None
+    result = await run_in_sandbox(current_code, corpus, timeout=SANDBOX_TIMEOUT)
+    key_sets = Counter(tuple(r["keys"]) for r in result.get("results", []) if r["ok"] and r["keys"] is not None)
+    if not key_sets:
+        return None
+    return list(key_sets.most_common(1)[0][0])
+
+async def already_fixed(current_code, payloads):
+    """True nếu code hiện tại chạy được trên tất cả payload lỗi (lỗi đã được sửa trước đó)."""
+    result = await run_in_sandbox(current_code, payloads, timeout=SANDBOX_TIMEOUT)
+    records = result.get("results")
+    return not result.get("error") and bool(records) and all(r["ok"] for r in records)
+
+async def evaluate_candidate(code, payloads, corpus, expected_keys):
+    """
+    Chạy thử một bản sửa trong sandbox trên payload lỗi và corpus payload tốt.
+    Trả về (ok, detail, thời gian xử lý mỗi record tính bằng ns).
+    """
+    result = await run_in_sandbox(code, payloads + corpus, repeat=SANDBOX_REPEAT, timeout=SANDBOX_TIMEOUT)
+    if result.get("error"):
+        return False, result["error"], None
+    for record_result in result["results"]:
+        if not record_result["ok"]:
+            return False, record_result["error"], None
+        if expected_keys is not None and record_result["keys"] != expected_keys:
+            return False, f"Output schema changed: {record_result['keys']} != {expected_keys}", None
+    return True, "ok", result["per_record_ns"]
+
+async def call_ollama_to_fix(error_msg, traceback_str, bad_code, payloads, schema_diff=None, temperature=0.2):
+    """Gửi Prompt tới Ollama (có thể kèm nhiều payload lỗi cùng loại)."""
     
-    # Prompt được tối ưu cho Local Model (yêu cầu rõ ràng, ngắn gọn)
+    # Prompt được tối ưu cho Local Model (yêu cầu rõ ràng, ngắn gọn).
+    # Payload đã được ETL rút gọn (chuỗi dài bị cắt), nên ta chỉ dump JSON gọn.
+    examples = "\n    ".join(json.dumps(p, ensure_ascii=False) for p in payloads)
     prompt = f"""
     You are an expert Python Data Engineer. The following ETL transformation code failed.
     
-    --- FAILED DATA INPUT ---
-    {payload}
+    --- FAILED DATA INPUTS ({len(payloads)} example(s), long values truncated) ---
+    {examples}
+    
+    --- SCHEMA CHANGE VS LAST GOOD INPUT ---
+    {format_schema_diff(schema_diff)}
     
     --- ERROR MESSAGE ---
     {error_msg}
@@ -75,32 +243,53 @@ async def call_ollama_to_fix(error_msg, traceback_str, bad_code, payload):
     {bad_code}
     
     --- YOUR TASK ---
-    1. Analyze why the code failed with the given input.
-    2. Fix the python code to handle this edge case (e.g., use try-except, data validation, or type conversion).
+    1. Analyze why the code failed with the given inputs.
+    2. Fix the python code so it works for ALL inputs above (e.g., use try-except, data validation, or type conversion).
     3. RETURN ONLY THE FULL VALID PYTHON CODE. DO NOT EXPLAIN. DO NOT RETURN MARKDOWN TEXT OUTSIDE THE CODE BLOCK.
     """
 
     logging.info(f"Sending request to Ollama ({OLLAMA_MODEL})...")
-    
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            response = await client.post(
-                OLLAMA_URL,
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.2 # Giữ nhiệt độ thấp để code chính xác
-                    }
+
+    # Stream token và dừng ngay khi khối ```python đã đóng: phần giải thích model
+    # viết thêm sau đó không cần thiết. Thoát khỏi stream sẽ đóng connection,
+    # Ollama phát hiện client ngắt và dừng sinh token.
+    text = ""
+    code_start = -1
+    try:
+        async with get_ollama_client().stream(
+            "POST",
+            OLLAMA_URL,
+            json={
+                "model": OLLAMA_MODEL,
+                "prompt": prompt,
+                "stream": True,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": {
+                    "temperature": temperature # Nhiệt độ thấp để code chính xác, cao hơn để đa dạng
                 }
-            )
+            }
+        ) as response:
             response.raise_for_status()
-            result = response.json()
-            return result.get("response", "")
-        except Exception as e:
-            logging.error(f"Ollama connection failed: {e}")
-            raise e
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                text += part.get("response", "")
+                if part.get("done"):
+                    break
+
+                if code_start < 0:
+                    code_start = text.find("```python")
+                    if code_start >= 0:
+                        code_start += len("```python")
+                if code_start >= 0 and text.find("```", code_start) >= 0:
+                    logging.info("Code block closed, stopping Ollama generation early.")
+                    break
+    except Exception as e:
+        logging.error(f"Ollama connection failed: {e}")
+        raise e
+
+    return text
 
 # async def restart_etl_container():
 #     """Restart container ETL để load code mới."""
@@ -122,6 +311,132 @@ async def call_ollama_to_fix(error_msg, traceback_str, bad_code, payload):
 #     except Exception as e:
 #         logging.error(f"Error executing docker restart: {e}")
 
+async def generate_candidates(job, current_code):
+    """Hỏi Ollama song song với các temperature khác nhau, trả về các bản sửa khác nhau."""
+    responses = await asyncio.gather(*[
+        call_ollama_to_fix(
+            error_msg=job.error,
+            traceback_str=job.traceback,
+            bad_code=current_code,
+            payloads=job.examples,
+            schema_diff=job.schema_diff,
+            temperature=temperature
+        )
+        for temperature in REPAIR_TEMPERATURES
+    ], return_exceptions=True) # Lỗi từng request đã được log bên trong call_ollama
+
+    candidates = []
+    for raw_response in responses:
+        if isinstance(raw_response, Exception):
+            continue
+        fixed_code = extract_python_code(raw_response)
+        if not fixed_code or "def transform" not in fixed_code:
+            logging.warning("AI did not return valid python code.")
+            logging.info(f"AI Response: {raw_response}")
+            continue
+        if fixed_code not in candidates:
+            candidates.append(fixed_code)
+    return candidates
+
+async def run_self_healing(job):
+    """Xử lý một job sửa lỗi. Trả về (status, detail) cho RepairQueue."""
+    logging.info(f"Starting Self-Healing Process for job {job.id} ({len(job.examples)} examples)...")
+
+    # Bước A: Đọc code cũ (kho của route gửi báo lỗi)
+    try:
+        store = get_transform_store(job.route)
+    except ValueError as e:
+        return "failed", str(e)
+
+    # Kho của route còn trống: ETL gửi kèm source đang chạy để làm phiên bản khởi đầu
+    if store.current() is None and job.seed_code:
+        version = store.publish(job.seed_code, origin="seed")
+        logging.info(f"Transform store of route '{job.route}' seeded from ETL (version {version}).")
+
+    current_code = read_current_code(store)
+    if not current_code:
+        logging.error("Aborting: Cannot read current transform code")
+        return "failed", "Cannot read current transform code"
+
+    # Báo lỗi tới sau khi job trước đã deploy bản sửa: phiên bản hiện tại có thể đã xử lý
+    # được các payload này, không cần hỏi Ollama thêm bản sửa chồng lên code đã đúng.
+    # Example đã bị ETL rút gọn nên chạy qua được chưa đủ: phiên bản hiện tại phải khác
+    # phiên bản đã lỗi, nếu không lỗi có thể nằm ở phần giá trị đã bị cắt.
+    failed_version = job.version or (TransformStore.version_id(job.seed_code) if job.seed_code else None)
+    if failed_version and store.current() != failed_version and await already_fixed(current_code, job.examples):
+        logging.info(f"Job {job.id}: current transform version already handles the failing payloads.")
+        return "fixed", "already fixed by current version"
+
+    corpus = get_good_corpus(job.route).records()
+    expected_keys = await expected_output_keys(current_code, corpus)
+
+    # Bước B: Tra cache - cùng code, cùng lỗi, cùng tập key thì dùng lại bản sửa cũ
+    cache_key = RepairCache.make_key(current_code, job.signature, job.examples[0])
+    cached_code = repair_cache.get(cache_key)
+    if cached_code:
+        ok, detail, _ = await evaluate_candidate(cached_code, job.examples, corpus, expected_keys)
+        if ok and write_new_code(store, cached_code, origin="repair_cache", job_id=job.id):
+            logging.info("Self-Healing Process Completed from repair cache!")
+            return "fixed", "Deployed fix from repair cache"
+        logging.warning(f"Cached fix rejected ({detail}), asking Ollama instead.")
+        repair_cache.delete(cache_key)
+
+    # Bước C: Hỏi Ollama song song nhiều bản sửa (một prompt cho tất cả payload lỗi đã gom)
+    candidates = await generate_candidates(job, current_code)
+    if not candidates:
+        return "failed", "AI did not return any valid python code"
+
+    # Bước D: Chạy thử song song từng bản trong sandbox, chọn bản đúng và nhanh nhất
+    evaluations = await asyncio.gather(*[
+        evaluate_candidate(code, job.examples, corpus, expected_keys) for code in candidates
+    ])
+    passing = []
+    for code, (ok, detail, per_record_ns) in zip(candidates, evaluations):
+        if ok:
+            passing.append((per_record_ns or 0, code))
+        else:
+            logging.warning(f"Candidate fix rejected: {detail}")
+
+    if not passing:
+        logging.error(f"None of the {len(candidates)} AI fixes passed validation.")
+        return "failed", f"All {len(candidates)} candidate fixes failed validation"
+
+    per_record_ns, fixed_code = min(passing, key=lambda item: item[0])
+    logging.info(f"{len(passing)}/{len(candidates)} candidates passed, deploying fastest ({per_record_ns} ns/record).")
+
+    # Bước E: Lưu phiên bản mới và chuyển CURRENT, ETL tự nạp lại nên không cần restart.
+    if not write_new_code(store, fixed_code, origin="ollama", job_id=job.id, benchmark={"per_record_ns": per_record_ns}):
+        return "failed", "Cannot publish the new transform version"
+
+    repair_cache.put(cache_key, fixed_code, signature=job.signature, error=job.error)
+
+    logging.info("Self-Healing Process Completed!")
+    return "fixed", f"Deployed transform version {store.current()}"
+
+repair_queue = RepairQueue(
+    handler=run_self_healing,
+    maxsize=REPAIR_QUEUE_SIZE,
+    max_examples=REPAIR_MAX_EXAMPLES
+)
+
+keepalive_task = None
+
+@app.before_serving
+async def start_repair_worker():
+    global keepalive_task
+    seed_transform_store()
+    repair_queue.start()
+    if OLLAMA_KEEPALIVE_INTERVAL > 0:
+        keepalive_task = asyncio.create_task(keep_model_warm())
+
+@app.after_serving
+async def stop_repair_worker():
+    await repair_queue.stop()
+    if keepalive_task is not None:
+        keepalive_task.cancel()
+    if ollama_client is not None:
+        await ollama_client.aclose()
+
 # --- API ROUTES ---
 
 @app.route('/health', methods=['GET'])
@@ -130,58 +445,72 @@ async def health():
 
 @app.route('/transformation_error', methods=['POST'])
 async def transformation_error():
-    # 1. Check Lock
-    if processing_lock.locked():
-        logging.warning("Request ignored: Agent is already fixing code.")
-        return jsonify({"status": "busy", "message": "Already processing a fix"}), 429
-
-    data = await request.get_json()
+    data = await read_report()
     
     # Validation cơ bản
     if not data or 'error' not in data:
         return jsonify({"status": "error", "message": "Invalid payload"}), 400
 
-    # 2. Define Background Task
-    async def run_self_healing():
-        async with processing_lock:
-            logging.info("Starting Self-Healing Process...")
-            
-            # Bước A: Đọc code cũ
-            current_code = read_current_code()
-            if not current_code:
-                logging.error("Aborting: Cannot read function.py")
-                return
-
-            # Bước B: Hỏi Ollama
-            try:
-                raw_response = await call_ollama_to_fix(
-                    error_msg=data['error'],
-                    traceback_str=data.get('traceback', ''),
-                    bad_code=current_code,
-                    payload=data.get('payload_data', {})
-                )
-            except Exception:
-                return # Đã log lỗi bên trong hàm call_ollama
-
-            # Bước C: Lọc lấy code sạch
-            fixed_code = extract_python_code(raw_response)
-            
-            if not fixed_code or "def transform" not in fixed_code:
-                logging.error("AI did not return valid python code.")
-                logging.info(f"AI Response: {raw_response}")
-                return
-
-            # Bước D: Ghi code mới
-            if write_new_code(fixed_code):
-                # Bước E: Restart ETL Service
-                await restart_etl_container()
-            
-            logging.info("Self-Healing Process Completed!")
-
-    # 3. Start Task (Fire and Forget)
-    asyncio.create_task(run_self_healing())
-
-    return jsonify({"status": "accepted", "message": "Agent is working on the fix"}), 202
+    # Payload tốt gửi kèm được lưu vào corpus để kiểm tra hồi quy các bản sửa
+    route = data.get('route')
+    try:
+        get_transform_store(route)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    get_good_corpus(route).add(data.get('good_samples'))
+
+    # Lỗi cùng chữ ký được gom vào job đang chờ/chạy thay vì bị từ chối
+    try:
+        job, coalesced = repair_queue.submit(data)
+    except QueueFull as e:
+        logging.warning(f"Request rejected: {e}")
+        return jsonify({"status": "busy", "message": str(e)}), 429
+
+    if coalesced:
+        logging.info(f"Report coalesced into repair job {job.id} ({job.reports} reports)")
+    else:
+        logging.info(f"Repair job {job.id} queued (signature {job.signature})")
+
+    return jsonify({
+        "status": "accepted",
+        "message": "Agent is working on the fix",
+        "job_id": job.id,
+        "coalesced": coalesced
+    }), 202
+
+@app.route('/repair_jobs', methods=['GET'])
+async def list_repair_jobs():
+    return jsonify({"jobs": repair_queue.jobs()}), 200
+
+@app.route('/repair_jobs/<job_id>', methods=['GET'])
+async def get_repair_job(job_id):
+    job = repair_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/transform/versions', methods=['GET'])
+async def list_transform_versions():
+    # ?route=<tên route> để xem kho của một route, mặc định là kho chung
+    try:
+        store = get_transform_store(request.args.get("route"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"current": store.current(), "versions": store.versions()}), 200
+
+@app.route('/transform/rollback', methods=['POST'])
+async def rollback_transform():
+    # Body tuỳ chọn {"version": "<hash>", "route": "<tên route>"}; mặc định quay về phiên bản cha
+    data = await request.get_json(silent=True) or {}
+    try:
+        store = get_transform_store(data.get("route"))
+        if data.get("version"):
+            store.activate(data["version"])
+        else:
+            store.rollback()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "ok", "current": store.current()}), 200
 
 if __name__ == '__main__':
     # Chạy trên port 5000
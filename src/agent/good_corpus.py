@@ -0,0 +1,69 @@
+import os
+import json
+import logging
+import tempfile
+from collections import OrderedDict
+from repair_queue import payload_fingerprint
+
+DEFAULT_MAX_RECORDS = 200
+
+class GoodCorpus:
+    def __init__(self, path: str, max_records: int = DEFAULT_MAX_RECORDS):
+        """
+        Tập các payload đã từng transform thành công (ETL gửi kèm trong báo lỗi).
+        Bản sửa mới phải chạy đúng trên các payload này để không làm hỏng dữ liệu cũ.
+        Lưu dạng JSON Lines, giữ tối đa max_records payload mới nhất, không trùng lặp.
+
+        :param path: Đường dẫn file corpus.
+        :param max_records: Số payload tối đa.
+        """
+        self.path = path
+        self.max_records = max_records
+        self._records = OrderedDict()  # fingerprint -> payload
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._records[payload_fingerprint(record)] = record
+        except Exception as e:
+            logging.warning(f"Failed to load good corpus {self.path}: {e}")
+
+    def add(self, records) -> int:
+        """Thêm payload tốt, trả về số payload mới thực sự được thêm."""
+        added = 0
+        for record in records or []:
+            if not isinstance(record, dict):
+                continue
+            fingerprint = payload_fingerprint(record)
+            if fingerprint in self._records:
+                self._records.move_to_end(fingerprint)
+                continue
+            self._records[fingerprint] = record
+            added += 1
+
+        while len(self._records) > self.max_records:
+            self._records.popitem(last=False)
+
+        if added:
+            self._save()
+        return added
+
+    def records(self) -> list:
+        return list(self._records.values())
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for record in self._records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Failed to save good corpus: {e}")
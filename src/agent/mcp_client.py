@@ -1,6 +1,8 @@
 import os
 import sys
-from contextlib import AsyncExitStack
+import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -8,61 +10,148 @@ from mcp.client.stdio import stdio_client
 # Using async anthropic client for better performance
 from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
-s
+
 # load the API key from .env file
 load_dotenv()
 
 MAX_TOKENS = 8192
 MODEL = "claude-3-7-sonnet-20250219"
 
-# Create a new session for each request
+# Upper bound on tool calls per query to prevent the LLM from cyclic reasoning
+MAX_TOOL_ITERATIONS = int(os.getenv("MCP_MAX_TOOL_ITERATIONS", 10))
+# Number of warm MCP server processes (= number of queries served concurrently)
+POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", 2))
+PING_TIMEOUT = float(os.getenv("MCP_PING_TIMEOUT", 2))
+
+class PooledSession:
+    def __init__(self, server_params: StdioServerParameters):
+        """
+        A long-lived MCP session over stdio.
+        The transport and session context managers are entered and exited inside one
+        dedicated task, as anyio requires, so the session can be shared across queries.
+        """
+        self.server_params = server_params
+        self.session = None
+        self.server_version = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error = None
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error:
+            raise self._error
+
+    async def _run(self):
+        try:
+            async with AsyncExitStack() as exit_stack:
+                stdio, write = await exit_stack.enter_async_context(stdio_client(self.server_params))
+                session = await exit_stack.enter_async_context(ClientSession(stdio, write))
+                init_result = await session.initialize()
+                self.server_version = f"{init_result.serverInfo.name}/{init_result.serverInfo.version}"
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logging.error(f"MCP session failed: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def is_healthy(self) -> bool:
+        """Cheap liveness check before reusing the session."""
+        if self.session is None or self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+# Sessions are pooled and reused across requests
 class MCPClient:
-    def __init__(self):
+    def __init__(self, pool_size: int = POOL_SIZE, max_tool_iterations: int = MAX_TOOL_ITERATIONS):
         self.server_script_path = None
+        self.server_params = None
         self.anthropic = AsyncAnthropic()
-    
+        self.max_tool_iterations = max_tool_iterations
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle = []
+        self._tools_cache = {}
+
     async def initialize(self, server_script_path: str):
         """Initialize the client with the server script path"""
-        self.server_script_path = server_script_path
-    
-    async def process_query(self, query: str) -> str:
-        """Process a query using a dedicated session for this request"""
-        if not self.server_script_path:
-            raise ValueError("Client not initialized. Call initialize() first.")
-            
-        # Create a new exit stack and session for this request
-        exit_stack = AsyncExitStack()
-        session = await self._create_session(exit_stack)
-        
-        try:
-            return await self._process_with_session(query, session)
-        finally:
-            # Clean up this request's resources
-            await exit_stack.aclose()
-    
-    async def _create_session(self, exit_stack):
-        """Create a new session with its own connection"""
-        is_python = self.server_script_path.endswith('.py')
-        is_js = self.server_script_path.endswith('.js')
+        is_python = server_script_path.endswith('.py')
+        is_js = server_script_path.endswith('.js')
         if not (is_python or is_js):
             raise ValueError("Server script must be a .py or .js file")
 
-        python_path = sys.executable
-        command = python_path if is_python else "node"
-        server_params = StdioServerParameters(
+        self.server_script_path = server_script_path
+        command = sys.executable if is_python else "node"
+        self.server_params = StdioServerParameters(
             command=command,
             args=[self.server_script_path],
             env=os.environ.copy()
         )
 
-        stdio_transport = await exit_stack.enter_async_context(stdio_client(server_params))
-        stdio, write = stdio_transport
-        session = await exit_stack.enter_async_context(ClientSession(stdio, write))
+    async def process_query(self, query: str) -> str:
+        """Process a query using a pooled session"""
+        if not self.server_script_path:
+            raise ValueError("Client not initialized. Call initialize() first.")
 
-        await session.initialize()
-        return session
-    
-    async def _process_with_session(self, query: str, session) -> str:
+        async with self._acquire_session() as pooled:
+            return await self._process_with_session(query, pooled)
+
+    @asynccontextmanager
+    async def _acquire_session(self):
+        """Check out a healthy warm session, starting a new server process only if needed"""
+        async with self._slots:
+            pooled = None
+            while self._idle:
+                candidate = self._idle.pop()
+                if await candidate.is_healthy():
+                    pooled = candidate
+                    break
+                await candidate.close()
+
+            if pooled is None:
+                pooled = PooledSession(self.server_params)
+                await pooled.start()
+
+            try:
+                yield pooled
+            finally:
+                self._idle.append(pooled)
+
+    async def _list_tools(self, pooled: PooledSession) -> list:
+        """Tool schemas, cached per server version (and server script revision)"""
+        try:
+            script_mtime = os.stat(self.server_script_path).st_mtime_ns
+        except OSError:
+            script_mtime = None
+        cache_key = (pooled.server_version, script_mtime)
+
+        if cache_key not in self._tools_cache:
+            response = await pooled.session.list_tools()
+            self._tools_cache = {cache_key: [{
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema
+            } for tool in response.tools]}
+        return self._tools_cache[cache_key]
+
+    async def _process_with_session(self, query: str, pooled: PooledSession) -> str:
         """Process a query with the given session"""
         messages = [
             {
@@ -71,19 +160,11 @@ class MCPClient:
             }
         ]
 
-        response = await session.list_tools()
-        available_tools = [{
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in response.tools]
-
+        available_tools = await self._list_tools(pooled)
         final_text = []
 
-        # Loop until LLM responses suggest tool use
-        # It's a good practice to put an upperbound on the number of calls
-        # to prevent LLM from cyclic reasoning
-        while True:
+        # Loop until LLM responses stop suggesting tool use, bounded by max_tool_iterations
+        for _ in range(self.max_tool_iterations):
             # Using await with AsyncAnthropic
             response = await self.anthropic.messages.create(
                 model=MODEL,
@@ -93,7 +174,7 @@ class MCPClient:
             )
 
             assistant_message_content = []
-            tool_used = False
+            tool_results = []
 
             for content in response.content:
                 if content.type == 'text':
@@ -101,43 +182,41 @@ class MCPClient:
                     assistant_message_content.append(content)
 
                 elif content.type == 'tool_use':
-                    tool_used = True
                     tool_name = content.name
                     tool_args = content.input
                     print(f".........Calling tool {tool_name} with args {tool_args}.........")
 
                     # Call the tool using this request's session
-                    result = await session.call_tool(tool_name, tool_args)
+                    result = await pooled.session.call_tool(tool_name, tool_args)
 
-                    # Append assistant's tool_use message
                     assistant_message_content.append(content)
-                    messages.append({
-                        "role": "assistant",
-                        "content": assistant_message_content
+                    tool_results.append({
+                        "type": "tool_result",
+                        "tool_use_id": content.id,
+                        "content": result.content
                     })
 
-                    # Add tool_result message
-                    messages.append({
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": result.content
-                            }
-                        ]
-                    })
+            messages.append({
+                "role": "assistant",
+                "content": assistant_message_content
+            })
 
-            # If no tools were called, just append the response and exit
-            if not tool_used:
-                messages.append({
-                    "role": "assistant",
-                    "content": assistant_message_content
-                })
+            # If no tools were called, we are done
+            if not tool_results:
                 break
 
+            # Add tool_result message
+            messages.append({
+                "role": "user",
+                "content": tool_results
+            })
+        else:
+            logging.warning(f"Stopped after {self.max_tool_iterations} tool iterations.")
+            final_text.append(f"Stopped after {self.max_tool_iterations} tool iterations.")
+
         return "\n".join(final_text)
-    
+
     async def cleanup(self):
-        """No global resources to clean up anymore"""
-        pass
\ No newline at end of file
+        """Shut down all pooled MCP server processes"""
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*[pooled.close() for pooled in idle])
@@ -1,8 +1,13 @@
+import os
+import re
 import json
 import sys
 import logging
+from collections import Counter
+from typing import Optional
 from kubecontrol import KubeControl
 from mcp.server.fastmcp import FastMCP
+from sandbox import run_in_sandbox
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stdout)
 
@@ -10,6 +15,29 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 mcp = FastMCP("etl_transformation_bugfix")
 kubecontrol = KubeControl(namespace="default")
 
+# Các bộ mẫu có tên dùng cho test hồi quy: <SAMPLE_SETS_DIR>/<name>.jsonl hoặc .json
+SAMPLE_SETS_DIR = os.getenv("SAMPLE_SETS_DIR", "samples")
+GOOD_CORPUS_PATH = os.getenv("GOOD_CORPUS_PATH", "cache/good_corpus.jsonl")
+
+def load_sample_set(name: str) -> list:
+    """Đọc một bộ mẫu theo tên; "good_corpus" là corpus payload tốt do Agent thu thập."""
+    if not re.fullmatch(r"[\w-]+", name):
+        raise ValueError(f"Invalid sample set name '{name}'.")
+
+    if name == "good_corpus":
+        candidates = [GOOD_CORPUS_PATH]
+    else:
+        candidates = [os.path.join(SAMPLE_SETS_DIR, f"{name}.jsonl"), os.path.join(SAMPLE_SETS_DIR, f"{name}.json")]
+
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+    raise ValueError(f"Sample set '{name}' not found.")
+
 @mcp.tool()
 async def get_transformation_function(configmap: str) -> str:
     """Load the transformation function from the specified kube configmap.
@@ -57,6 +85,71 @@ async def test_transformation_function(code: str, input_data: dict) -> str:
         logging.error(f"Error in transformation function: {e}")
         return str(e)
     
+@mcp.tool()
+async def test_transformation_function_batch(
+    code: str,
+    records: Optional[list[dict]] = None,
+    sample_set: Optional[str] = None,
+    expected_keys: Optional[list[str]] = None,
+    record_timeout: float = 1.0,
+    timeout: float = 60.0,
+) -> str:
+    """Test the transformation function on many records in one call.
+    The code is compiled once and run in a separate process with time limits.
+    Returns a JSON summary plus one compact entry per record.
+
+    Args:
+        code (str): The transformation function code as a string.
+        records (list[dict]): Input records to transform.
+        sample_set (str): Name of a stored sample set to add to the records (e.g. "good_corpus").
+        expected_keys (list[str]): Expected output keys. Defaults to the most common output key set.
+        record_timeout (float): Time limit in seconds for each record.
+        timeout (float): Time limit in seconds for the whole batch.
+    """
+    try:
+        batch = list(records or [])
+        if sample_set:
+            batch += load_sample_set(sample_set)
+        if not batch:
+            raise ValueError("Provide records or a sample_set.")
+
+        result = await run_in_sandbox(code, batch, timeout=timeout, record_timeout=record_timeout)
+        if result.get("error"):
+            raise ValueError(result["error"])
+
+        if expected_keys is None:
+            key_sets = Counter(tuple(r["keys"]) for r in result["results"] if r["ok"] and r["keys"] is not None)
+            expected = list(key_sets.most_common(1)[0][0]) if key_sets else None
+        else:
+            expected = sorted(expected_keys)
+
+        per_record = []
+        for i, r in enumerate(result["results"]):
+            if r["ok"]:
+                per_record.append({
+                    "i": i, "ok": True,
+                    "conforms": expected is None or r["keys"] == expected,
+                    "ms": round(r["ns"] / 1e6, 3)
+                })
+            else:
+                per_record.append({"i": i, "ok": False, "error_type": r["error_type"], "error": r["error"][:200]})
+
+        timings = sorted(r["ms"] for r in per_record if r["ok"])
+        summary = {
+            "total": len(per_record),
+            "passed": sum(1 for r in per_record if r["ok"]),
+            "non_conforming": sum(1 for r in per_record if r["ok"] and not r["conforms"]),
+            "error_types": dict(Counter(r["error_type"] for r in per_record if not r["ok"])),
+            "expected_keys": expected,
+            "p50_ms": timings[len(timings) // 2] if timings else None,
+            "max_ms": timings[-1] if timings else None,
+        }
+        logging.info(f"Batch test finished: {summary['passed']}/{summary['total']} passed.")
+        return json.dumps({"summary": summary, "records": per_record}, separators=(",", ":"))
+    except Exception as e:
+        logging.error(f"Error in batch transformation test: {e}")
+        return str(e)
+
 @mcp.tool()
 async def deploy_change(code: str, configmap: str, deployment_name: str) -> str:
     """Deploy the new transformation function code to kube configmap. And trigger a rolling restart of the deployment.
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+
+DEFAULT_MAX_ENTRIES = 256
+
+def code_hash(code: str) -> str:
+    """Hash nội dung code (bỏ khoảng trắng thừa cuối file)."""
+    return hashlib.sha256(code.rstrip().encode("utf-8")).hexdigest()
+
+def keyset_fingerprint(payload) -> str:
+    """Fingerprint của tập key đầu vào (không quan tâm giá trị)."""
+    keys = sorted(payload) if isinstance(payload, dict) else []
+    return hashlib.sha1("\x1f".join(map(str, keys)).encode("utf-8")).hexdigest()[:16]
+
+class RepairCache:
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Cache các lần sửa code đã được kiểm chứng, lưu trên đĩa.
+        Key = (hash code hiện tại, chữ ký lỗi, fingerprint tập key đầu vào).
+        Mỗi entry là một file JSON; mtime của file dùng làm thứ tự LRU.
+
+        :param directory: Thư mục lưu cache (nên mount volume để giữ qua restart).
+        :param max_entries: Số entry tối đa trước khi xoá bớt entry cũ nhất.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(current_code: str, signature: str, payload) -> str:
+        raw = "|".join([code_hash(current_code), signature, keyset_fingerprint(payload)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        """Trả về code đã sửa nếu có trong cache (và đánh dấu vừa dùng), ngược lại None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Cập nhật thứ tự LRU
+            return entry.get("code")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Corrupted repair cache entry {key}: {e}")
+            self.delete(key)
+            return None
+
+    def put(self, key: str, fixed_code: str, **metadata) -> None:
+        """Lưu code đã sửa (ghi file tạm rồi rename để không bao giờ đọc phải file dở)."""
+        entry = dict(metadata, code=fixed_code, created_at=time.time())
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            logging.error(f"Failed to write repair cache entry: {e}")
+            return
+        self._evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,191 @@
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_MAX_EXAMPLES = 3
+DEFAULT_JOB_HISTORY = 100
+
+class QueueFull(Exception):
+    """Hàng đợi sửa lỗi đã đầy, báo lỗi mới bị từ chối."""
+
+def payload_fingerprint(payload) -> str:
+    """Fingerprint của một payload (dùng để loại trùng example trong cùng job)."""
+    raw = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+def failure_signature(report: dict) -> str:
+    """
+    Chữ ký của một lỗi: cùng loại lỗi, cùng vị trí trong function.py và cùng
+    thay đổi schema thì coi là một lỗi, dù giá trị trong record khác nhau.
+    """
+    # Mỗi route có code riêng nên lỗi của các route khác nhau không bao giờ được gom chung
+    route = report.get("route") or ""
+    payload = report.get("payload_data") or {}
+    field_names = set(payload) if isinstance(payload, dict) else set()
+    diff = report.get("schema_diff") or {}
+    field_names.update(diff.get("removed", {}))
+
+    # Giữ lại tên field trong message (vd. KeyError: 'language'), bỏ giá trị cụ thể
+    def _normalize_literal(match):
+        return match.group(0) if match.group(1) in field_names else "'<v>'"
+
+    error = re.sub(r"'([^']*)'", _normalize_literal, report.get("error", ""))
+    error = re.sub(r"\d+", "N", error)
+
+    # Vị trí lỗi: frame cuối trong traceback đã được rút gọn
+    locations = re.findall(r"line (\d+), in (\w+)", report.get("traceback", ""))
+    location = ":".join(locations[-1]) if locations else ""
+
+    parts = [
+        route,
+        error,
+        location,
+        ",".join(sorted(diff.get("added", {}))),
+        ",".join(sorted(diff.get("removed", {}))),
+        ",".join(sorted(diff.get("type_changed", {}))),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+class RepairJob:
+    def __init__(self, signature: str, report: dict):
+        """
+        Một lần sửa code, gom nhiều báo lỗi có cùng chữ ký.
+
+        :param signature: Chữ ký lỗi (failure_signature).
+        :param report: Báo lỗi đầu tiên từ ETL.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.signature = signature
+        self.status = "queued"
+        self.detail = ""
+        self.route = report.get("route")
+        self.seed_code = report.get("seed_code")
+        # Phiên bản transform đã lỗi (None nếu ETL chạy từ function.py, khi đó dùng seed_code)
+        self.version = report.get("version")
+        self.error = report.get("error", "")
+        self.traceback = report.get("traceback", "")
+        self.schema_diff = report.get("schema_diff")
+        self.examples = []
+        self.reports = 0
+        self._fingerprints = set()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.add_report(report, max_examples=1)
+
+    def add_report(self, report: dict, max_examples: int) -> None:
+        """Gom thêm một báo lỗi; payload mới (khác nhau) được thêm làm example."""
+        self.reports += 1
+        payload = report.get("payload_data", {})
+        fingerprint = payload_fingerprint(payload)
+        if fingerprint in self._fingerprints or len(self.examples) >= max_examples:
+            return
+        self._fingerprints.add(fingerprint)
+        self.examples.append(payload)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "signature": self.signature,
+            "route": self.route,
+            "status": self.status,
+            "detail": self.detail,
+            "error": self.error,
+            "examples": len(self.examples),
+            "reports": self.reports,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class RepairQueue:
+    def __init__(self, handler, maxsize: int = DEFAULT_QUEUE_SIZE,
+                 max_examples: int = DEFAULT_MAX_EXAMPLES, history: int = DEFAULT_JOB_HISTORY):
+        """
+        Hàng đợi sửa lỗi có giới hạn, xử lý tuần tự bởi một worker.
+        Các báo lỗi có cùng chữ ký được gom vào job đang chờ thay vì bị từ chối.
+
+        :param handler: async def handler(job) -> (status, detail).
+        :param maxsize: Số job tối đa đang chờ.
+        :param max_examples: Số payload khác nhau tối đa gom vào một prompt.
+        :param history: Số job đã xong được giữ lại để tra trạng thái.
+        """
+        self.handler = handler
+        self.max_examples = max_examples
+        self.history = history
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._jobs = OrderedDict()
+        self._active = {}  # signature -> job đang chờ hoặc đang chạy
+        self._worker = None
+
+    def submit(self, report: dict):
+        """
+        Nhận một báo lỗi.
+
+        :return: (job, coalesced) - coalesced=True nếu báo lỗi được gom vào job có sẵn.
+        :raises QueueFull: nếu hàng đợi đã đầy.
+        """
+        signature = failure_signature(report)
+        job = self._active.get(signature)
+        if job is not None:
+            # Job đang chạy đã gửi prompt rồi, chỉ đếm thêm; job đang chờ thì lấy thêm example
+            max_examples = self.max_examples if job.status == "queued" else 0
+            job.add_report(report, max_examples=max_examples)
+            return job, True
+
+        job = RepairJob(signature, report)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"Repair queue is full ({self._queue.maxsize} jobs)")
+
+        self._active[signature] = job
+        self._jobs[job.id] = job
+        self._trim_history()
+        return job, False
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def _trim_history(self):
+        finished = [jid for jid, job in self._jobs.items() if job.finished_at is not None]
+        for jid in finished[: max(0, len(self._jobs) - self.history)]:
+            del self._jobs[jid]
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.status, job.detail = await self.handler(job)
+            except Exception as e:
+                logging.error(f"Repair job {job.id} crashed: {e}")
+                job.status, job.detail = "failed", str(e)
+            finally:
+                job.finished_at = time.time()
+                self._active.pop(job.signature, None)
+                self._queue.task_done()
+            logging.info(f"Repair job {job.id} {job.status} ({job.reports} reports, {len(job.examples)} examples)")
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
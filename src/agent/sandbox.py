@@ -0,0 +1,104 @@
+# Chạy thử hàm transform trong process riêng: process con đọc {"code", "records", "repeat", "record_timeout"}
+# từ stdin, compile code một lần, chạy transform trên từng record và in kết quả ra stdout.
+# Code lỗi hoặc treo chỉ làm chết process con, Agent không bị ảnh hưởng.
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+
+SANDBOX_SCRIPT = os.path.abspath(__file__)
+DEFAULT_TIMEOUT = 10.0
+
+class RecordTimeout(BaseException):
+    """Kế thừa BaseException để `except Exception:` trong code transform không nuốt mất timeout."""
+
+def _on_alarm(signum, frame):
+    raise RecordTimeout("record exceeded time limit")
+
+def run_records(code: str, records: list, repeat: int = 1, record_timeout: float = None) -> dict:
+    """
+    Compile code một lần rồi chạy transform trên từng record.
+
+    :param code: Source code chứa hàm transform.
+    :param records: Danh sách record đầu vào.
+    :param repeat: Số lần chạy mỗi record để đo thời gian (lấy giá trị nhỏ nhất).
+    :param record_timeout: Giới hạn thời gian (giây) cho mỗi lần chạy một record, dùng SIGALRM nên
+                           chỉ áp dụng khi chạy trong main thread của process con.
+    """
+    try:
+        local_context = {}
+        exec(compile(code, "function.py", "exec"), local_context)
+        transform_func = local_context.get("transform")
+        if not callable(transform_func):
+            raise ValueError("No 'transform' function found in the provided code.")
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "results": []}
+
+    if record_timeout:
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+    results = []
+    for record in records:
+        best_ns = None
+        try:
+            for _ in range(max(1, repeat)):
+                # Timer đặt lại cho từng lần chạy: giới hạn áp dụng cho một lần, không phải tổng các lần lặp
+                if record_timeout:
+                    signal.setitimer(signal.ITIMER_REAL, record_timeout)
+                try:
+                    start = time.perf_counter_ns()
+                    output = transform_func(record)
+                    elapsed = time.perf_counter_ns() - start
+                finally:
+                    if record_timeout:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                best_ns = elapsed if best_ns is None else min(best_ns, elapsed)
+            keys = sorted(output) if isinstance(output, dict) else None
+            results.append({"ok": True, "keys": keys, "ns": best_ns})
+        except (Exception, RecordTimeout) as e:
+            results.append({"ok": False, "error_type": type(e).__name__, "error": f"{type(e).__name__}: {e}"})
+
+    passed = [r for r in results if r["ok"]]
+    timings = sorted(r["ns"] for r in passed)
+    return {
+        "ok": len(passed) == len(results),
+        "results": results,
+        "per_record_ns": timings[len(timings) // 2] if timings else None,
+    }
+
+async def run_in_sandbox(code: str, records: list, repeat: int = 1, timeout: float = DEFAULT_TIMEOUT,
+                         record_timeout: float = None) -> dict:
+    """
+    Chạy run_records trong một process Python riêng, kill nếu quá timeout.
+    """
+    request = json.dumps({
+        "code": code, "records": records, "repeat": repeat, "record_timeout": record_timeout
+    }).encode("utf-8")
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, SANDBOX_SCRIPT,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(request), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {"ok": False, "error": f"Timeout: sandbox exceeded {timeout}s", "results": []}
+
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        logging.error(f"Sandbox crashed: {stderr.decode(errors='replace')[-500:]}")
+        return {"ok": False, "error": f"Sandbox crashed with exit code {proc.returncode}", "results": []}
+
+if __name__ == "__main__":
+    task = json.load(sys.stdin)
+    # stdout dành cho kết quả, print() trong code transform được chuyển sang stderr
+    real_stdout, sys.stdout = sys.stdout, sys.stderr
+    result = run_records(task["code"], task.get("records", []), task.get("repeat", 1), task.get("record_timeout"))
+    real_stdout.write(json.dumps(result, default=str))
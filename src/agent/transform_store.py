@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import marshal
+import hashlib
+import logging
+import tempfile
+
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+SOURCE_FILE = "source.py"
+META_FILE = "meta.json"
+# Tên file dùng khi compile, để traceback của ETL vẫn trỏ về "function.py"
+CODE_FILENAME = "function.py"
+# Hash phiên bản: 16 ký tự hex đầu của sha256 (xem version_id)
+VERSION_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+def bytecode_file() -> str:
+    """Bytecode chỉ dùng được với đúng phiên bản Python, nên tên file gắn với cache_tag."""
+    return f"{sys.implementation.cache_tag}.bin"
+
+class TransformStore:
+    def __init__(self, root: str):
+        """
+        Kho lưu các phiên bản hàm transform, mỗi phiên bản nằm trong thư mục theo hash nội dung:
+
+            <root>/versions/<hash>/source.py     - source code
+            <root>/versions/<hash>/<tag>.bin     - bytecode đã compile sẵn (marshal)
+            <root>/versions/<hash>/meta.json     - origin, parent, benchmark, ...
+            <root>/CURRENT                       - hash của phiên bản đang chạy
+
+        CURRENT được thay bằng os.replace nên ETL không bao giờ đọc phải trạng thái dở dang;
+        ETL chỉ cần stat file này để biết có phiên bản mới.
+
+        :param root: Thư mục gốc của kho (được mount chung cho Agent và ETL).
+        """
+        self.root = root
+        os.makedirs(os.path.join(self.root, VERSIONS_DIR), exist_ok=True)
+
+    @staticmethod
+    def version_id(source: str) -> str:
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+    def _version_dir(self, version: str) -> str:
+        # Version có thể đến từ request (rollback), không cho phép tạo đường dẫn ra ngoài kho
+        if not isinstance(version, str) or not VERSION_PATTERN.fullmatch(version):
+            raise ValueError(f"Invalid transform version {version!r}")
+        return os.path.join(self.root, VERSIONS_DIR, version)
+
+    def current(self):
+        """Hash của phiên bản đang chạy, None nếu kho còn trống."""
+        try:
+            with open(os.path.join(self.root, CURRENT_POINTER), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def read_source(self, version: str = None) -> str:
+        version = version or self.current()
+        if not version:
+            return ""
+        with open(os.path.join(self._version_dir(version), SOURCE_FILE), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def metadata(self, version: str) -> dict:
+        with open(os.path.join(self._version_dir(version), META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def versions(self) -> list:
+        """Metadata của mọi phiên bản, mới nhất trước."""
+        result = []
+        for entry in os.scandir(os.path.join(self.root, VERSIONS_DIR)):
+            if entry.is_dir() and not entry.name.startswith("."):
+                try:
+                    result.append(self.metadata(entry.name))
+                except Exception as e:
+                    logging.warning(f"Skipping unreadable transform version {entry.name}: {e}")
+        return sorted(result, key=lambda meta: meta["created_at"], reverse=True)
+
+    def publish(self, source: str, origin: str, parent: str = None, activate: bool = True, **metadata) -> str:
+        """
+        Lưu một phiên bản mới (compile sẵn bytecode) và trỏ CURRENT tới nó nếu activate=True.
+
+        :param source: Source code của hàm transform.
+        :param origin: Nguồn gốc phiên bản (seed, ollama, repair_cache, ...).
+        :param parent: Phiên bản trước đó, dùng cho rollback.
+        :return: Hash của phiên bản.
+        :raises SyntaxError: nếu source không compile được.
+        """
+        version = self.version_id(source)
+        version_dir = self._version_dir(version)
+
+        if not os.path.isdir(version_dir):
+            code = compile(source, CODE_FILENAME, "exec")
+            meta = dict(metadata, version=version, origin=origin, parent=parent, created_at=time.time())
+
+            # Ghi vào thư mục tạm rồi rename cả thư mục, phiên bản chỉ xuất hiện khi đã đầy đủ
+            tmp_dir = tempfile.mkdtemp(dir=os.path.join(self.root, VERSIONS_DIR), prefix=".tmp-")
+            try:
+                with open(os.path.join(tmp_dir, SOURCE_FILE), "w", encoding="utf-8") as f:
+                    f.write(source)
+                with open(os.path.join(tmp_dir, bytecode_file()), "wb") as f:
+                    f.write(marshal.dumps(code))
+                with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, indent=2)
+                os.rename(tmp_dir, version_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                # Một process khác vừa lưu đúng phiên bản này
+                if not os.path.isdir(version_dir):
+                    raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version: str) -> None:
+        """Đổi phiên bản đang chạy bằng một lần rename nguyên tử."""
+        if not os.path.isdir(self._version_dir(version)):
+            raise ValueError(f"Unknown transform version {version}")
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".CURRENT-")
+        with os.fdopen(fd, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_POINTER))
+        logging.info(f"Transform version {version} is now current.")
+
+    def rollback(self) -> str:
+        """Quay về phiên bản cha của phiên bản hiện tại."""
+        current = self.current()
+        if not current:
+            raise ValueError("Transform store is empty")
+        parent = self.metadata(current).get("parent")
+        if not parent:
+            raise ValueError(f"Version {current} has no parent to roll back to")
+        self.activate(parent)
+        return parent
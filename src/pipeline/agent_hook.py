@@ -1,21 +1,56 @@
 import os
+import re
+import time
+import queue
 import httpx
 import logging
-import traceback
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Union
 from dotenv import load_dotenv
+from repair_payload import RepairPayloadBuilder
 
 # Load env variables
 load_dotenv()
 
 # Default config
 DEFAULT_TIMEOUT = 60
+# Mỗi chữ ký lỗi chỉ được báo Agent một lần trong một cửa sổ sửa lỗi (giây)
+DEFAULT_REPORT_WINDOW = 300
+# Số báo lỗi tối đa chờ gửi ở thread nền
+DEFAULT_OUTBOX_SIZE = 100
+
+
+def failure_key(payload: Dict[str, Any], version: Optional[str] = None) -> tuple:
+    """
+    Chữ ký của một lỗi phía ETL: cùng phiên bản code, cùng loại exception, cùng vị trí
+    trong function.py và cùng thay đổi schema thì coi là một lỗi (giống chữ ký phía Agent).
+
+    :param payload: Payload đã dựng bởi RepairPayloadBuilder.build.
+    :param version: Phiên bản transform đang chạy (None nếu chạy từ function.py).
+    """
+    error_type = payload.get("error", "").split(":", 1)[0]
+    locations = re.findall(r"line (\d+), in (\w+)", payload.get("traceback", ""))
+    diff = payload.get("schema_diff") or {}
+    return (
+        version,
+        error_type,
+        locations[-1] if locations else None,
+        tuple(sorted(diff.get("added", {}))),
+        tuple(sorted(diff.get("removed", {}))),
+        tuple(sorted(diff.get("type_changed", {}))),
+    )
+
 
 class AgentHook:
-    def __init__(self, webhook_url: str):
+    def __init__(self, webhook_url: str, payload_builder: Optional[RepairPayloadBuilder] = None,
+                 route: Optional[str] = None):
         """
         Khởi tạo AgentHook.
         Validate URL ngay lập tức để tránh lỗi runtime muộn.
+
+        :param webhook_url: Endpoint /transformation_error của Agent.
+        :param payload_builder: Bộ dựng payload gọn (mặc định tạo mới theo env).
+        :param route: Tên route của transform (Agent sửa riêng kho phiên bản của route này).
         """
         self.webhook_url = webhook_url
         if not self.webhook_url or not self.webhook_url.strip():
@@ -28,52 +63,136 @@ class AgentHook:
         except ValueError:
             self.timeout = DEFAULT_TIMEOUT
 
-    def call_agent_hook(self, error: str, payload_data: Dict[str, Any]) -> None:
+        try:
+            self.report_window = float(os.environ.get("REPAIR_REPORT_WINDOW", DEFAULT_REPORT_WINDOW))
+        except ValueError:
+            self.report_window = DEFAULT_REPORT_WINDOW
+
+        self.payload_builder = payload_builder or RepairPayloadBuilder()
+        self.route = route
+
+        # Chữ ký lỗi -> thời điểm báo gần nhất; POST chạy ở thread nền để không chặn ETL
+        self._reported: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue(maxsize=DEFAULT_OUTBOX_SIZE)
+        self._sender = None
+        self.suppressed = 0
+
+    def record_success(self, payload_data: Union[Dict[str, Any], bytes]) -> None:
+        """
+        Ghi nhận record vừa transform thành công, làm schema "known-good"
+        để lần lỗi sau chỉ cần gửi phần diff.
+
+        :param payload_data: Bytes JSON gốc của message (hoặc dict chưa bị transform sửa).
+        """
+        self.payload_builder.observe_good(payload_data)
+
+    def call_agent_hook(self, error: str, payload_data: Dict[str, Any], seed_code: Optional[str] = None,
+                        version: Optional[str] = None) -> bool:
         """
         Gửi tín hiệu lỗi tới Agent AI để kích hoạt quy trình sửa code.
+        Lỗi trùng chữ ký với lỗi đã báo trong cửa sổ sửa lỗi bị bỏ qua; báo lỗi mới được
+        đưa vào hàng đợi và POST ở thread nền.
 
-        :param error: Thông điệp lỗi (str).
+        :param error: Exception hoặc thông điệp lỗi.
         :param payload_data: Dữ liệu gây ra lỗi (dict).
+        :param seed_code: Source transform đang chạy, chỉ gửi khi kho phiên bản của route còn trống.
+        :param version: Phiên bản transform đang chạy (lỗi của phiên bản mới luôn được báo).
+        :return: True nếu báo lỗi được đưa vào hàng đợi gửi.
         """
         if not self.webhook_url:
             logging.error("Cannot call Agent: Webhook URL is missing.")
-            return
+            return False
+
+        # Traceback lấy từ exception hiện tại (chỉ đúng khi hàm này được gọi trong block except),
+        # giá trị lớn bị cắt ngắn và chỉ gửi schema diff so với schema tốt gần nhất
+        payload = self.payload_builder.build(error, payload_data)
+
+        key = failure_key(payload, version)
+        now = time.monotonic()
+        with self._lock:
+            last = self._reported.get(key)
+            if last is not None and now - last < self.report_window:
+                self.suppressed += 1
+                logging.debug("Agent already notified about this failure, skipping report.")
+                return False
+            self._reported[key] = now
+            if len(self._reported) > DEFAULT_OUTBOX_SIZE:
+                self._reported = {k: t for k, t in self._reported.items() if now - t < self.report_window}
+
+        if self.route:
+            payload["route"] = self.route
+        if seed_code:
+            payload["seed_code"] = seed_code
+        if version:
+            # Agent chỉ coi lỗi là "đã sửa" khi phiên bản hiện tại khác phiên bản đã lỗi
+            payload["version"] = version
+        body, headers = self.payload_builder.encode(payload)
+        headers["User-Agent"] = "ETL-Pipeline-Service/1.0"
+
+        try:
+            self._outbox.put_nowait((key, body, headers))
+        except queue.Full:
+            logging.warning("Agent report queue is full, dropping report.")
+            self._forget(key)
+            return False
 
-        # Lấy traceback hiện tại (chỉ hoạt động đúng khi hàm này được gọi trong block except)
-        tb_str = traceback.format_exc()
+        self._ensure_sender()
+        return True
 
-        payload = {
-            "error": str(error),
-            "payload_data": payload_data,
-            "traceback": tb_str,
-        }
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Chờ các báo lỗi trong hàng đợi được gửi xong. Trả về False nếu hết thời gian chờ."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._outbox.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
 
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "ETL-Pipeline-Service/1.0"
-        }
+    def _forget(self, key: tuple) -> None:
+        """Bỏ chữ ký khỏi danh sách đã báo để lần lỗi sau được báo lại."""
+        with self._lock:
+            self._reported.pop(key, None)
 
-        logging.info(f"Contacting Agent at {self.webhook_url}...")
+    def _ensure_sender(self) -> None:
+        with self._lock:
+            if self._sender is None or not self._sender.is_alive():
+                self._sender = threading.Thread(target=self._send_loop, name="agent-hook", daemon=True)
+                self._sender.start()
+
+    def _send_loop(self) -> None:
+        # Một client cho cả thread để giữ connection pool giữa các lần báo lỗi
+        with httpx.Client(timeout=self.timeout) as client:
+            while True:
+                key, body, headers = self._outbox.get()
+                try:
+                    if not self._post(client, body, headers):
+                        # Agent không nhận được báo lỗi: cho phép báo lại ở lần lỗi sau
+                        self._forget(key)
+                finally:
+                    self._outbox.task_done()
+
+    def _post(self, client: httpx.Client, body: bytes, headers: Dict[str, str]) -> bool:
+        logging.info("Contacting Agent at %s...", self.webhook_url)
 
         try:
-            # Sử dụng Context Manager để quản lý connection pool hiệu quả
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers=headers
-                )
-                
-                # Kiểm tra HTTP Status (4xx, 5xx sẽ raise exception)
-                response.raise_for_status()
-                
-                logging.info(f"Agent acknowledged receipt. Status: {response.status_code}")
-                # Có thể log thêm response body nếu cần debug: logging.debug(response.json())
+            response = client.post(
+                self.webhook_url,
+                content=body,
+                headers=headers
+            )
+
+            # Kiểm tra HTTP Status (4xx, 5xx sẽ raise exception)
+            response.raise_for_status()
+
+            logging.info("Agent acknowledged receipt. Status: %s", response.status_code)
+            # Có thể log thêm response body nếu cần debug: logging.debug(response.json())
+            return True
 
         except httpx.ConnectError:
             # Lỗi này rất thường gặp ở Local Docker nếu Agent chưa start xong
             logging.error(f"Connection Refused: Could not connect to Agent at {self.webhook_url}. Is the Agent container running?")
-        
+
         except httpx.TimeoutException:
             logging.error(f"Timeout: Agent took longer than {self.timeout}s to respond.")
 
@@ -81,4 +200,5 @@ class AgentHook:
             logging.error(f"Agent returned error {e.response.status_code}: {e.response.text}")
 
         except Exception as e:
-            logging.error(f"Unexpected error calling Agent: {e}")
\ No newline at end of file
+            logging.error(f"Unexpected error calling Agent: {e}")
+        return False
@@ -0,0 +1,79 @@
+import os
+import json
+import logging
+from typing import Any, Optional
+
+# Thứ tự ưu tiên khi không chỉ định codec: thư viện nhanh trước, json chuẩn làm dự phòng
+CODEC_PREFERENCE = ("orjson", "msgspec", "json")
+
+
+class Codec:
+    """
+    Lớp JSON codec dùng chung cho Pipeline: loads nhận bytes/str, dumps trả về bytes (UTF-8,
+    không escape ký tự non-ASCII giống json.dumps(..., ensure_ascii=False)).
+    """
+    name = "json"
+    decode_errors = (ValueError,)
+
+    def loads(self, data) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self.decode_errors = (orjson.JSONDecodeError,)
+
+    def loads(self, data) -> Any:
+        return self._orjson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, option=self._orjson.OPT_NON_STR_KEYS)
+
+
+class MsgspecCodec(Codec):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self.decode_errors = (msgspec.DecodeError,)
+
+    def loads(self, data) -> Any:
+        return self._decoder.decode(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+
+_CODECS = {"orjson": OrjsonCodec, "msgspec": MsgspecCodec, "json": Codec}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Chọn codec theo tên (orjson, msgspec, json). Không chỉ định thì lấy codec nhanh nhất
+    đang được cài; codec được chỉ định mà chưa cài thì dùng json chuẩn.
+    """
+    names = [name.lower()] if name else list(CODEC_PREFERENCE)
+    for codec_name in names:
+        codec_cls = _CODECS.get(codec_name)
+        if codec_cls is None:
+            logging.warning(f"Unknown JSON codec '{codec_name}', falling back to json.")
+            continue
+        try:
+            return codec_cls()
+        except ImportError:
+            if name:
+                logging.warning(f"JSON codec '{codec_name}' is not installed, falling back to json.")
+    return Codec()
+
+
+# Codec mặc định của Pipeline (chọn bằng biến môi trường JSON_CODEC)
+codec = get_codec(os.getenv("JSON_CODEC"))
@@ -1,6 +1,7 @@
 import logging
-import json
 import os
+from typing import Union
+from codec import codec
 
 class Loader:
     def __init__(self, output_path: str = "output/data_warehouse.jsonl"):
@@ -14,18 +15,21 @@ class Loader:
         if not os.path.exists(os.path.dirname(self.output_path)):
             os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
 
-    def load(self, data: dict):
+    def load(self, data: Union[dict, bytes]):
         """
         Ghi dữ liệu đã transform vào file local (append mode).
         
-        :param data: Dữ liệu dictionary sau khi đã transform.
+        :param data: Dữ liệu dictionary sau khi đã transform, hoặc bytes JSON đã encode sẵn
+                     (được ghi thẳng, không encode lại).
         """
         try:
+            line = data if isinstance(data, bytes) else codec.dumps(data)
             # Ghi vào file dưới dạng JSON Lines (mỗi dòng 1 json)
-            with open(self.output_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            with open(self.output_path, 'ab') as f:
+                f.write(line + b"\n")
             
-            logging.info(f"Data loaded to {self.output_path}: {data}")
+            # Nội dung record chỉ log ở DEBUG (format lười, không tốn gì khi tắt DEBUG)
+            logging.debug("Data loaded to %s: %s", self.output_path, data)
             
         except Exception as e:
             logging.error(f"Failed to load data: {e}")
@@ -0,0 +1,193 @@
+import sys
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from collections import Counter
+
+# Format chung cho toàn bộ Pipeline
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# extra= cho các log không được bỏ qua bởi RateLimitFilter
+NO_RATE_LIMIT = {"rate_limit": False}
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Ghép message (msg % args) ngay trong thread gọi log: args có thể là dict mà thread ETL
+    còn sửa tiếp (vd. record bị transform sửa tại chỗ rồi re-queue), format muộn ở thread nền
+    sẽ log sai giá trị hoặc lỗi "dictionary changed size during iteration".
+    Phần còn lại (format dòng log, traceback, ghi stdout) vẫn diễn ra ở thread nền.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, per_interval: int = 5, interval: float = 10.0):
+        """
+        Giới hạn số log cùng loại (cùng logger + cùng template message) trong mỗi khoảng thời gian.
+        Log bị bỏ qua được đếm và báo lại ở log cùng loại đầu tiên của khoảng tiếp theo.
+        Log gắn extra={"rate_limit": False} (vd. dòng tổng hợp của MessageStats) không bị giới hạn.
+
+        :param per_interval: Số log tối đa mỗi loại trong một khoảng.
+        :param interval: Độ dài khoảng (giây).
+        """
+        super().__init__()
+        self.per_interval = per_interval
+        self.interval = interval
+        self._window_start = time.monotonic()
+        self._counts = Counter()
+        self._suppressed = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "rate_limit", True) is False:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._counts.clear()
+
+            self._counts[key] += 1
+            if self._counts[key] > self.per_interval:
+                self._suppressed[key] += 1
+                return False
+
+            suppressed = self._suppressed.pop(key, 0)
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} (+{suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+    def drain(self) -> Counter:
+        """Lấy và xoá số log bị bỏ qua chưa được báo ({(logger, template): count})."""
+        with self._lock:
+            suppressed, self._suppressed = self._suppressed, Counter()
+        return suppressed
+
+
+def _drain_suppressed() -> Counter:
+    """Gom số log bị bỏ qua chưa được báo của mọi RateLimitFilter trên root logger."""
+    pending = Counter()
+    for handler in logging.getLogger().handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, RateLimitFilter):
+                pending.update(log_filter.drain())
+    return pending
+
+
+class MessageStats:
+    def __init__(self, interval: float = 30.0, name: str = "Pipeline"):
+        """
+        Đếm số message theo kết quả và định kỳ log một dòng tổng hợp,
+        thay cho việc log từng message ở mức INFO.
+
+        :param interval: Chu kỳ log tổng hợp (giây), <= 0 để tắt.
+        :param name: Tiền tố trong dòng log.
+        """
+        self.interval = interval
+        self.name = name
+        self._counts = Counter()
+        self._totals = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, outcome: str, route: str = None) -> None:
+        """
+        :param outcome: Kết quả xử lý (ok, failed, ...).
+        :param route: Tên route (khi Pipeline phục vụ nhiều loại message), mỗi route một dòng tổng hợp.
+        """
+        with self._lock:
+            self._counts[(route, outcome)] += 1
+            self._totals[(route, outcome)] += 1
+
+    def totals(self) -> dict:
+        """Số message tích luỹ từ khi khởi động: {route: {outcome: count}}."""
+        with self._lock:
+            items = list(self._totals.items())
+        result = {}
+        for (route, outcome), count in items:
+            result.setdefault(route, {})[outcome] = count
+        return result
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+
+        by_route = {}
+        for (route, outcome), count in counts.items():
+            by_route.setdefault(route, {})[outcome] = count
+
+        for route, outcomes in sorted(by_route.items(), key=lambda item: item[0] or ""):
+            name = f"{self.name}[{route}]" if route else self.name
+            details = ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items()))
+            # Mọi route dùng chung một template: không để rate limit bỏ mất dòng của route thứ 6 trở đi
+            logging.info("%s: %d messages in the last %ss (%s)", name, sum(outcomes.values()), self.interval, details,
+                         extra=NO_RATE_LIMIT)
+
+        # Log bị rate limit mà sau đó không lặp lại thì không có dịp báo số lượng, báo ở đây
+        suppressed = _drain_suppressed()
+        if suppressed:
+            details = ", ".join(f"{count}x {str(msg)[:60]!r}" for (_, msg), count in suppressed.most_common())
+            logging.warning("%s: %d log messages suppressed (%s)", self.name, sum(suppressed.values()), details,
+                            extra=NO_RATE_LIMIT)
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+
+        def _run():
+            while not self._stop.wait(self.interval):
+                self.flush()
+
+        self._thread = threading.Thread(target=_run, name="message-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+def setup_logging(level: str = "INFO", async_mode: bool = True,
+                  rate_limit: int = 5, rate_interval: float = 10.0):
+    """
+    Cấu hình logging cho Pipeline.
+
+    :param level: Mức log (DEBUG để xem nội dung từng message).
+    :param async_mode: Đẩy log qua queue để thread nền format và ghi stdout.
+    :param rate_limit: Số log tối đa mỗi loại trong rate_interval giây (0 để tắt).
+    :param rate_interval: Độ dài khoảng rate limit (giây).
+    :return: QueueListener đang chạy (None nếu không dùng async).
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    listener = None
+    if async_mode:
+        handler = _DeferredQueueHandler(queue.SimpleQueue())
+        listener = logging.handlers.QueueListener(handler.queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        # Ghi nốt log còn trong queue khi process kết thúc
+        atexit.register(listener.stop)
+    else:
+        handler = stream_handler
+
+    if rate_limit > 0:
+        handler.addFilter(RateLimitFilter(per_interval=rate_limit, interval=rate_interval))
+    root.addHandler(handler)
+    return listener
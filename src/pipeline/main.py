@@ -1,5 +1,4 @@
 import os
-import sys
 import logging
 from dotenv import load_dotenv
 
@@ -11,17 +10,22 @@ from pipeline import Pipeline
 from transformer import Transformer
 from loader import Loader
 from agent_hook import AgentHook
+from router import TransformRegistry
+from log_utils import setup_logging, MessageStats
 
 # Import Subscriber phiên bản Local mà ta vừa sửa
 from subscriber import LocalFileSubscriber
 
 def main():
     # 1. Cấu hình Logging (Standard Python Logging)
-    # Không dùng google.cloud.logging nữa để tránh lỗi credentials
-    logging.basicConfig(
-        level=logging.INFO, 
-        format='%(asctime)s - %(levelname)s - %(message)s', 
-        stream=sys.stdout
+    # Không dùng google.cloud.logging nữa để tránh lỗi credentials.
+    # Mặc định log đi qua queue tới thread nền, log cùng loại bị giới hạn tần suất;
+    # đặt LOG_LEVEL=DEBUG để xem nội dung từng message.
+    setup_logging(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        async_mode=os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes"),
+        rate_limit=int(os.getenv("LOG_RATE_LIMIT", 5)),
+        rate_interval=float(os.getenv("LOG_RATE_INTERVAL", 10))
     )
     logging.info("Starting Local ETL Pipeline...")
 
@@ -31,28 +35,42 @@ def main():
     subscriber = LocalFileSubscriber(queue_file_path=queue_path)
     logging.info(f"Subscriber connected to local queue: {queue_path}")
 
-    # 3. Khởi tạo Transformer (Dynamic Loading)
-    # File function.py cần nằm cùng thư mục hoặc được mount vào container
-    transformer = Transformer(function_path="function.py")
-
-    # 4. Khởi tạo Loader (Ghi ra File)
-    # Mặc định ghi ra output/data_warehouse.jsonl
+    store_path = os.getenv("TRANSFORM_STORE_PATH", "transforms")
     output_path = os.getenv("OUTPUT_FILE_PATH", "output/data_warehouse.jsonl")
-    loader = Loader(output_path=output_path)
-
-    # 5. Khởi tạo Agent Hook (Giao tiếp với AI Agent)
     # AGENT_SERVICE_URL sẽ là địa chỉ của container Agent (ví dụ: http://agent:5000/webhook)
     agent_url = os.getenv("AGENT_SERVICE_URL", "http://localhost:5000/webhook")
-    agent_hook = AgentHook(webhook_url=agent_url)
+
+    # Nhiều loại message trong một process: mỗi route có transform, đích ghi và kho phiên bản riêng
+    routes_path = os.getenv("ROUTES_FILE_PATH")
+    if routes_path:
+        registry = TransformRegistry.from_config(
+            routes_path,
+            agent_url=agent_url,
+            store_root=store_path,
+            output_dir=os.path.dirname(output_path) or "output"
+        )
+    else:
+        # 3. Khởi tạo Transformer (Dynamic Loading)
+        # Ưu tiên phiên bản CURRENT trong kho transform do Agent quản lý,
+        # nếu kho còn trống thì dùng function.py (cần nằm cùng thư mục hoặc được mount vào container)
+        transformer = Transformer(function_path="function.py", store_path=store_path)
+
+        # 4. Khởi tạo Loader (Ghi ra File)
+        # Mặc định ghi ra output/data_warehouse.jsonl
+        loader = Loader(output_path=output_path)
+
+        # 5. Khởi tạo Agent Hook (Giao tiếp với AI Agent)
+        agent_hook = AgentHook(webhook_url=agent_url)
+        registry = TransformRegistry.single(transformer, loader, agent_hook)
 
     # 6. Khởi tạo Pipeline chính
     pipeline = Pipeline(
         subscriber=subscriber,
-        transformer=transformer,
-        loader=loader,
-        agent_hook=agent_hook,
+        registry=registry,
         # Thời gian chờ nếu gặp lỗi trước khi thử lại (giây)
-        error_delay=int(os.getenv("ERROR_DELAY", 5))
+        error_delay=int(os.getenv("ERROR_DELAY", 5)),
+        # Log tổng hợp "N messages in the last Xs" thay cho log từng message
+        stats=MessageStats(interval=float(os.getenv("LOG_SUMMARY_INTERVAL", 30)))
     )
 
     # 7. Bắt đầu chạy Pipeline
@@ -1,12 +1,17 @@
 import logging
 import time
+from typing import Optional
+from log_utils import MessageStats
 from loader import Loader
 from subscriber import Subscriber
 from transformer import Transformer
 from agent_hook import AgentHook
+from router import TransformRegistry
 
 class Pipeline:
-    def __init__ (self, subscriber: Subscriber, transformer: Transformer, loader: Loader, agent_hook: AgentHook, error_delay: int=-1):
+    def __init__ (self, subscriber: Subscriber, transformer: Optional[Transformer] = None, loader: Optional[Loader] = None,
+                  agent_hook: Optional[AgentHook] = None, error_delay: int=-1, stats: MessageStats=None,
+                  registry: Optional[TransformRegistry] = None):
         """
         Initialize the ETL Pipeline with subscriber, transformer, and loader components.
 
@@ -14,44 +19,104 @@ class Pipeline:
         :param transformer: The transformer component to process messages.
         :param loader: The loader component to store processed messages.
         :param agent_hook: The agent hook component for error handling.
-        :param error_delay: Delay in seconds before retrying on error (-1 for infinite wait).
+        :param error_delay: Seconds before a failed message is retried; only that message waits, the others
+                            keep flowing (<= 0 retries it immediately).
+        :param stats: Aggregated per-interval message counters (replaces per-message INFO logs).
+        :param registry: Routes message types to their own transformer, loader and agent hook.
+                         Defaults to a single route built from transformer, loader and agent_hook.
         """
+        if registry is None:
+            if transformer is None or loader is None or agent_hook is None:
+                raise ValueError("Either registry or transformer, loader and agent_hook must be provided.")
+            registry = TransformRegistry.single(transformer, loader, agent_hook)
+
         self.subscriber = subscriber
-        self.transformer = transformer
-        self.loader = loader
-        self.agent_hook = agent_hook
+        self.registry = registry
         self.error_delay = error_delay
+        self.stats = stats or MessageStats()
 
     def _initialize(self):
         # KHÔNG load transform ở đây nữa
         # transform = self.transformer.create() <-- XÓA DÒNG NÀY
         
-        logging.info("Pipeline initialized in Hot-Reload mode.")
+        logging.info(f"Pipeline initialized in Hot-Reload mode with {len(self.registry.routes)} route(s).")
 
         def wrapped_callback(message):
             parsed_message = self.subscriber.parse_message(message)
 
+            # Chọn route qua bảng tra cứu dựng sẵn (discriminator, tập key, topic)
+            route = self.registry.resolve(parsed_message, getattr(message, "topic", None))
+            if route is None:
+                # Không được ack rồi bỏ: ghi vào dead-letter nếu có, ngược lại re-queue
+                logging.error("No route for message: %s", parsed_message)
+                self.stats.record("unrouted")
+                if self.registry.unrouted is not None:
+                    try:
+                        self.registry.unrouted.load(parsed_message)
+                        self.subscriber.acknowledge_message(message)
+                        return
+                    except Exception as e:
+                        logging.error("Failed to write unrouted message: %s", e)
+                self.subscriber.handle_error_message(message, delay=self.error_delay)
+                return
+
             try:
                 # CÁCH 2: Luôn load code mới nhất trước khi chạy
                 # Điều này đảm bảo nếu Agent vừa sửa file, ta sẽ chạy code mới ngay
-                current_transform_func = self.transformer.create()
+                current_transform_func = route.transformer.create()
                 
                 # Chạy transform
                 transformed_data = current_transform_func(parsed_message)
                 
             except Exception as e:
                 # ... (Logic xử lý)
-                logging.error(f"Loading error: {e}")
-                self.subscriber.handle_error_message(message)
+                # Transform có thể đã sửa parsed_message trước khi lỗi: log và báo Agent bản gốc
+                original_message = self.subscriber.original_message(message)
+                # Chỉ khi lỗi mới log nội dung payload
+                logging.error("Loading error in route %s: %s | payload: %s", route.name, e, original_message)
+                self.stats.record("failed", route.name)
+
+                # Kho phiên bản của route còn trống: gửi kèm source để Agent khởi tạo kho
+                seed_code = None
+                if route.transformer.version is None:
+                    try:
+                        seed_code = route.transformer.read_source()
+                    except OSError:
+                        pass
+
+                # Báo Agent trong block except để traceback còn nguyên
+                # (lỗi trùng chữ ký đã báo bị bỏ qua, POST chạy ở thread nền)
+                route.agent_hook.call_agent_hook(
+                    e, original_message, seed_code=seed_code, version=route.transformer.version
+                )
+                self.subscriber.handle_error_message(message, delay=self.error_delay)
+                return
+
+            # Schema của record thành công là mốc so sánh cho lần lỗi tiếp theo
+            # (bytes gốc, vì transform có thể đã sửa parsed_message tại chỗ)
+            route.agent_hook.record_success(message.data)
+
+            try:
+                route.loader.load(transformed_data)
+            except Exception as e:
+                # Lỗi ghi dữ liệu không phải lỗi transform, chỉ re-queue chứ không gọi Agent
+                logging.error("Failed to load message in route %s: %s", route.name, e)
+                self.stats.record("load_failed", route.name)
+                self.subscriber.handle_error_message(message, delay=self.error_delay)
                 return
 
             # time.sleep(2)
             # Acknowledge the message only after successful loading
             self.subscriber.acknowledge_message(message)
+            self.stats.record("ok", route.name)
             return
 
         self.wrapped_callback = wrapped_callback
 
     def start(self):
         self._initialize()
-        self.subscriber.subscribe(self.wrapped_callback)
+        self.stats.start()
+        try:
+            self.subscriber.subscribe(self.wrapped_callback)
+        finally:
+            self.stats.stop()
@@ -0,0 +1,189 @@
+import os
+import sys
+import gzip
+import json
+import traceback
+from collections import deque
+from typing import Dict, Any, Optional, Tuple, Union
+
+# Giới hạn mặc định cho payload gửi tới Agent
+DEFAULT_MAX_VALUE_CHARS = 80
+DEFAULT_MAX_ITEMS = 5
+DEFAULT_GZIP_MIN_BYTES = 1024
+DEFAULT_GOOD_SAMPLES = 3
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def type_name(value: Any) -> str:
+    """Tên kiểu JSON-friendly của một giá trị (dùng cho schema)."""
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def schema_of(data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Schema phẳng của một record: {key: type}.
+
+    :param data: Record dạng dict.
+    """
+    if not isinstance(data, dict):
+        return {}
+    return {str(key): type_name(value) for key, value in data.items()}
+
+
+def schema_diff(good: Optional[Dict[str, str]], current: Dict[str, str]) -> Dict[str, Any]:
+    """
+    So sánh schema hiện tại với schema "known-good" gần nhất.
+
+    :return: {"added": {...}, "removed": {...}, "type_changed": {key: [old, new]}}.
+             Nếu chưa có schema tốt nào, toàn bộ schema hiện tại được trả về trong "current".
+    """
+    if good is None:
+        return {"known_good": False, "current": current}
+
+    return {
+        "known_good": True,
+        "added": {k: t for k, t in current.items() if k not in good},
+        "removed": {k: t for k, t in good.items() if k not in current},
+        "type_changed": {
+            k: [good[k], t] for k, t in current.items() if k in good and good[k] != t
+        },
+    }
+
+
+class RepairPayloadBuilder:
+    def __init__(
+        self,
+        function_filename: str = "function.py",
+        max_value_chars: Optional[int] = None,
+        max_items: Optional[int] = None,
+        compress: Optional[bool] = None,
+        gzip_min_bytes: Optional[int] = None,
+        good_samples: Optional[int] = None,
+    ):
+        """
+        Dựng payload gọn gửi tới Agent khi transform lỗi.
+        Prompt càng ngắn thì model local trả lời càng nhanh, nên ta chỉ gửi những gì
+        cần cho việc sửa code: giá trị đã cắt ngắn, schema diff và traceback trong function.py.
+
+        :param function_filename: Tên file transform, dùng để lọc frame trong traceback
+                                  (code nạp từ kho phiên bản luôn mang tên function.py).
+        :param max_value_chars: Độ dài tối đa của một chuỗi trước khi bị cắt.
+        :param max_items: Số phần tử tối đa được giữ lại trong list (dict luôn giữ đủ key).
+        :param compress: Bật gzip cho body (mặc định lấy từ env REPAIR_PAYLOAD_GZIP).
+        :param gzip_min_bytes: Chỉ gzip khi body lớn hơn ngưỡng này.
+        :param good_samples: Số record thành công gần nhất gửi kèm (Agent dùng để kiểm tra hồi quy).
+        """
+        self.function_filenames = {os.path.basename(function_filename), "function.py"}
+        self.max_value_chars = max_value_chars or _env_int("REPAIR_MAX_VALUE_CHARS", DEFAULT_MAX_VALUE_CHARS)
+        self.max_items = max_items or _env_int("REPAIR_MAX_ITEMS", DEFAULT_MAX_ITEMS)
+        if compress is None:
+            compress = os.environ.get("REPAIR_PAYLOAD_GZIP", "false").lower() in ("1", "true", "yes")
+        self.compress = compress
+        self.gzip_min_bytes = gzip_min_bytes or _env_int("REPAIR_GZIP_MIN_BYTES", DEFAULT_GZIP_MIN_BYTES)
+
+        # Record transform thành công gần nhất (làm mốc schema) và vài record gửi kèm
+        self._last_good = None
+        if good_samples is None:
+            good_samples = _env_int("REPAIR_GOOD_SAMPLES", DEFAULT_GOOD_SAMPLES)
+        self.good_samples = deque(maxlen=max(0, good_samples))
+
+    def observe_good(self, data: Union[Dict[str, Any], bytes]) -> None:
+        """
+        Ghi nhận một record vừa transform thành công.
+
+        :param data: Record dạng dict, hoặc bytes JSON gốc của message. Nên dùng bytes vì
+                     transform có thể đã sửa dict đầu vào tại chỗ, còn bytes thì không.
+        """
+        # Chỉ giữ tham chiếu, việc decode để dành tới lúc thật sự gửi báo lỗi
+        self._last_good = data
+        self.good_samples.append(data)
+
+    @staticmethod
+    def _decode(sample: Union[Dict[str, Any], bytes]) -> Any:
+        return json.loads(sample) if isinstance(sample, bytes) else sample
+
+    @property
+    def good_schema(self) -> Optional[Dict[str, str]]:
+        """Schema "known-good": schema của record thành công gần nhất."""
+        if self._last_good is None:
+            return None
+        return schema_of(self._decode(self._last_good))
+
+    def elide(self, value: Any) -> Any:
+        """
+        Cắt ngắn giá trị lớn nhưng giữ nguyên kiểu dữ liệu,
+        để Agent vẫn có thể chạy thử code trên payload đã rút gọn.
+        Dict ở mọi độ sâu giữ đủ key (code truy cập theo key không bị KeyError giả),
+        chỉ chuỗi dài và phần đuôi của list dài bị cắt.
+        """
+        if isinstance(value, str):
+            if len(value) > self.max_value_chars:
+                return value[: self.max_value_chars] + "..."
+            return value
+        if isinstance(value, dict):
+            return {k: self.elide(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.elide(v) for v in value[: self.max_items]]
+        return value
+
+    def trim_traceback(self, exc_info=None) -> str:
+        """
+        Chỉ giữ lại các frame nằm trong file transform (function.py) và dòng lỗi cuối.
+        Nếu không có frame nào trong function.py, giữ frame cuối cùng.
+        """
+        exc_type, exc, tb = exc_info or sys.exc_info()
+        if exc_type is None:
+            return ""
+
+        frames = traceback.extract_tb(tb)
+        relevant = [f for f in frames if os.path.basename(f.filename) in self.function_filenames]
+        if not relevant and frames:
+            relevant = [frames[-1]]
+
+        lines = traceback.format_list(relevant)
+        lines += traceback.format_exception_only(exc_type, exc)
+        return "".join(lines)
+
+    def build(self, error: Any, payload_data: Dict[str, Any], exc_info=None) -> Dict[str, Any]:
+        """
+        Dựng payload gửi tới Agent.
+
+        :param error: Exception hoặc thông điệp lỗi.
+        :param payload_data: Record gây lỗi.
+        :param exc_info: Tuple từ sys.exc_info(); mặc định lấy exception đang xử lý.
+        """
+        if isinstance(error, BaseException):
+            error_msg = f"{type(error).__name__}: {error}"
+        else:
+            error_msg = str(error)
+
+        return {
+            "error": error_msg,
+            "payload_data": self.elide(payload_data),
+            "schema_diff": schema_diff(self.good_schema, schema_of(payload_data)),
+            "traceback": self.trim_traceback(exc_info),
+            # Không rút gọn: Agent dùng các record này để kiểm tra hồi quy bản sửa,
+            # record bị cắt có thể làm chính code hiện tại chạy lỗi
+            "good_samples": [self._decode(sample) for sample in self.good_samples],
+        }
+
+    def encode(self, payload: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Serialize payload thành body HTTP (JSON gọn, gzip nếu được bật và đủ lớn).
+
+        :return: (body, headers bổ sung)
+        """
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress and len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
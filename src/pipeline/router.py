@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from transformer import Transformer
+from loader import Loader
+from agent_hook import AgentHook
+from repair_payload import RepairPayloadBuilder
+
+# Tên trùng với file/thư mục của kho mặc định (<store_root>/CURRENT, <store_root>/versions)
+RESERVED_ROUTE_NAMES = {"versions", "CURRENT"}
+
+class Route:
+    def __init__(self, name: str, transformer: Transformer, loader: Loader, agent_hook: AgentHook,
+                 topics: Optional[List[str]] = None, values: Optional[List[Any]] = None,
+                 key_sets: Optional[List[List[str]]] = None):
+        """
+        Một loại message: transform (hot-reload riêng), nơi ghi dữ liệu và Agent hook riêng.
+
+        :param name: Tên route, cũng là tên kho phiên bản transform của route phía Agent.
+        :param transformer: Transformer của route.
+        :param loader: Loader (đích ghi) của route.
+        :param agent_hook: Agent hook của route (báo lỗi kèm tên route).
+        :param topics: Các topic (tên queue) thuộc route này.
+        :param values: Các giá trị của trường discriminator thuộc route này.
+        :param key_sets: Các tập key đầu vào (schema) thuộc route này.
+        """
+        # Tên route được dùng làm tên thư mục kho phiên bản
+        if not re.fullmatch(r"[\w-]+", name) or name in RESERVED_ROUTE_NAMES:
+            raise ValueError(f"Invalid route name '{name}'")
+        self.name = name
+        self.transformer = transformer
+        self.loader = loader
+        self.agent_hook = agent_hook
+        self.topics = topics or []
+        self.values = values or []
+        self.key_sets = key_sets or []
+
+class TransformRegistry:
+    def __init__(self, routes: List[Route], discriminator: Optional[str] = None, default: Optional[str] = None,
+                 unrouted: Optional[Loader] = None):
+        """
+        Bảng định tuyến message -> route, dựng sẵn các dict tra cứu để mỗi message chỉ tốn
+        vài phép tra dict. Thứ tự ưu tiên: giá trị discriminator, tập key, topic, route mặc định.
+
+        :param routes: Danh sách route.
+        :param discriminator: Tên trường dùng để phân loại message (vd. "type").
+        :param default: Tên route nhận các message không khớp route nào.
+        :param unrouted: Loader (dead-letter) ghi lại message không có route nào nhận,
+                         khi không có cả route mặc định. None thì message được re-queue.
+        """
+        self.routes = {route.name: route for route in routes}
+        self.discriminator = discriminator
+        self.unrouted = unrouted
+        self.default = self.routes.get(default) if default else None
+        if default and self.default is None:
+            raise ValueError(f"Default route '{default}' is not defined")
+
+        self._by_value = {}
+        self._by_keys = {}
+        self._by_topic = {}
+        for route in routes:
+            for value in route.values:
+                self._register(self._by_value, value, route, "discriminator value")
+            for keys in route.key_sets:
+                self._register(self._by_keys, frozenset(keys), route, "key set")
+            for topic in route.topics:
+                self._register(self._by_topic, topic, route, "topic")
+
+    @staticmethod
+    def _register(table: dict, key, route: Route, kind: str):
+        if key in table and table[key] is not route:
+            raise ValueError(f"Duplicate {kind} {key!r} for routes '{table[key].name}' and '{route.name}'")
+        table[key] = route
+
+    def resolve(self, record: Any, topic: Optional[str] = None) -> Optional[Route]:
+        """Tìm route cho một message, None nếu không có route nào phù hợp."""
+        if isinstance(record, dict):
+            if self.discriminator and self._by_value:
+                value = record.get(self.discriminator)
+                if value is not None:
+                    try:
+                        route = self._by_value.get(value)
+                    except TypeError:  # giá trị không hash được (list, dict)
+                        route = None
+                    if route is not None:
+                        return route
+            if self._by_keys:
+                route = self._by_keys.get(frozenset(record))
+                if route is not None:
+                    return route
+        if topic is not None and self._by_topic:
+            route = self._by_topic.get(topic)
+            if route is not None:
+                return route
+        return self.default
+
+    @classmethod
+    def single(cls, transformer: Transformer, loader: Loader, agent_hook: AgentHook, name: str = "default"):
+        """Registry một route duy nhất (cách chạy cũ: một transform, một đích ghi)."""
+        return cls([Route(name, transformer, loader, agent_hook)], default=name)
+
+    @classmethod
+    def from_config(cls, config_path: str, agent_url: str, store_root: str = "transforms",
+                    output_dir: str = "output"):
+        """
+        Dựng registry từ file JSON, ví dụ:
+
+            {
+              "discriminator": "type",
+              "default": "people",
+              "routes": [
+                {"name": "people", "function": "function.py", "values": ["person"],
+                 "keys": [["id", "name", "language", "bio", "version"]]},
+                {"name": "orders", "function": "routes/orders.py", "topics": ["orders"],
+                 "output": "output/orders.jsonl"}
+              ]
+            }
+
+        Mỗi route có kho phiên bản riêng <store_root>/<name> và mặc định ghi ra <output_dir>/<name>.jsonl.
+        Message không khớp route nào (và không có "default") được ghi vào "unrouted",
+        mặc định <output_dir>/unrouted.jsonl.
+        """
+        with open(config_path, "r", encoding="utf-8") as f:
+            config: Dict[str, Any] = json.load(f)
+
+        routes = []
+        for spec in config.get("routes", []):
+            name = spec["name"]
+            function_path = spec.get("function", f"{name}.py")
+            transformer = Transformer(
+                function_path=function_path,
+                store_path=os.path.join(store_root, name),
+                code_filename=f"{name}/function.py"
+            )
+            loader = Loader(output_path=spec.get("output", os.path.join(output_dir, f"{name}.jsonl")))
+            agent_hook = AgentHook(
+                webhook_url=agent_url,
+                payload_builder=RepairPayloadBuilder(function_filename=function_path),
+                route=name
+            )
+            routes.append(Route(
+                name, transformer, loader, agent_hook,
+                topics=spec.get("topics"),
+                values=spec.get("values"),
+                key_sets=spec.get("keys")
+            ))
+
+        logging.info(f"Loaded {len(routes)} routes from {config_path}")
+        unrouted = Loader(output_path=config.get("unrouted", os.path.join(output_dir, "unrouted.jsonl")))
+        return cls(routes, discriminator=config.get("discriminator"), default=config.get("default"),
+                   unrouted=unrouted)
@@ -1,22 +1,49 @@
 import logging
-import json
 import time
 import os
 from typing import Any, Callable, Optional, List
+from codec import codec
+
+# Message re-queue có hẹn giờ được bọc trong envelope này trong file queue
+NOT_BEFORE_KEY = "__not_before__"
+MESSAGE_KEY = "__message__"
+# File sidecar ghi lô message đang xử lý (<queue>.inflight) và các message đã xong (<queue>.inflight.done)
+INFLIGHT_SUFFIX = ".inflight"
+DONE_SUFFIX = ".done"
 
 # --- CLASS GIẢ LẬP MESSAGE CỦA PUBSUB ---
 class MockMessage:
     """
     Class này giả lập behavior của Google Pub/Sub Message.
     Giúp logic chính không bị lỗi khi gọi .ack() hoặc .data
+
+    Message giữ cả bytes gốc (data) và bản đã decode (value), mỗi dạng chỉ được tạo
+    tối đa một lần: record đọc từ file queue đã là dict nên không bị decode lại. Bytes là
+    bản gốc bất biến (transform có thể sửa dict value tại chỗ), nên cần được tạo trước khi
+    chạy transform.
     """
-    def __init__(self, data_dict: dict):
-        # PubSub trả về data dưới dạng bytes, nên ta encode lại
-        self.data = json.dumps(data_dict).encode("utf-8")
+    def __init__(self, data_dict: Optional[dict] = None, raw: Optional[bytes] = None, topic: Optional[str] = None):
+        self._decoded = data_dict
+        self._raw = raw
+        # Topic nguồn của message, dùng để định tuyến khi Pipeline phục vụ nhiều loại message
+        self.topic = topic
+
+    @property
+    def data(self) -> bytes:
+        # PubSub trả về data dưới dạng bytes
+        if self._raw is None:
+            self._raw = codec.dumps(self._decoded) if self._decoded is not None else b""
+        return self._raw
+
+    @property
+    def value(self) -> dict:
+        if self._decoded is None:
+            self._decoded = codec.loads(self._raw) if self._raw else {}
+        return self._decoded
 
     def ack(self):
         # Ở local file, việc lấy message ra khỏi list đã coi như là ack rồi
-        logging.info("MockMessage: Acknowledged (Auto-removed from queue file)")
+        logging.debug("MockMessage: Acknowledged (Auto-removed from queue file)")
 
 # --- BASE CLASS (GIỮ NGUYÊN) ---
 class Subscriber:
@@ -32,77 +59,231 @@ class Subscriber:
     def acknowledge_message(self, message: Any) -> None:
         raise NotImplementedError("The 'acknowledge_message' method is not implemented in the base class.")
     
-    def handle_error_message(self, message: Any) -> None:
+    def handle_error_message(self, message: Any, delay: float = 0) -> None:
         raise NotImplementedError("The 'handle_error_message' method is not implemented in the base class.")
 
+    def original_message(self, message: Any) -> dict:
+        raise NotImplementedError("The 'original_message' method is not implemented in the base class.")
+
 # --- LOCAL FILE SUBSCRIBER (THAY THẾ PUBSUB) ---
 class LocalFileSubscriber(Subscriber):
-    def __init__(self, queue_file_path: str = "queue/messages.json", timeout: Optional[int] = None):
+    def __init__(self, queue_file_path: str = "queue/messages.json", timeout: Optional[int] = None,
+                 batch_size: int = 100, topic: Optional[str] = None):
         """
         :param queue_file_path: Đường dẫn đến file JSON đóng vai trò là hàng đợi.
+        :param batch_size: Số message lấy ra mỗi lần đọc file (file chỉ được decode và ghi lại một lần
+                           cho cả lô). Lô đang xử lý được ghi vào file sidecar <queue>.inflight, nếu process
+                           chết giữa chừng thì các message chưa xong được đưa lại vào queue khi khởi động.
+        :param topic: Tên topic gắn vào message (mặc định là tên file queue, vd. "messages").
         """
         self.queue_file = queue_file_path
+        self.inflight_file = queue_file_path + INFLIGHT_SUFFIX
+        self.done_file = self.inflight_file + DONE_SUFFIX
+        self.topic = topic or os.path.splitext(os.path.basename(queue_file_path))[0]
         self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        # Message lỗi (vị trí trong lô, record gốc) chờ được ghi lại cuối queue khi xử lý xong lô
+        self._requeued: List[tuple] = []
+        self._claim_index: Optional[int] = None
+        self._done = None
         
         # Tạo file queue nếu chưa tồn tại
         if not os.path.exists(self.queue_file):
             os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
-            with open(self.queue_file, 'w') as f:
-                json.dump([], f)
+            self._write_queue([])
 
-    def subscribe(self, callback: Callable):
+    def _read_queue(self) -> Optional[list]:
+        """Đọc toàn bộ queue. None nếu file không decode được (file được giữ nguyên, không ghi đè)."""
+        with open(self.queue_file, 'rb') as f:
+            raw = f.read()
+        try:
+            return codec.loads(raw) if raw.strip() else []
+        except codec.decode_errors as e:
+            logging.error(f"Cannot decode queue file {self.queue_file} with {codec.name} codec, leaving it untouched: {e}")
+            return None
+
+    @staticmethod
+    def _write_atomic(path: str, content: bytes):
+        # Ghi file tạm rồi rename: process chết giữa chừng không để lại file ghi dở
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _write_queue(self, messages: list):
+        self._write_atomic(self.queue_file, codec.dumps(messages))
+
+    def _claim(self, messages: list, now: float):
         """
-        Thay vì streaming từ Google, ta dùng vòng lặp để đọc file JSON.
+        Tách queue thành (lô message đến hạn, phần còn lại theo đúng thứ tự).
+        Message re-queue có hẹn giờ chưa tới hạn được giữ lại trong queue và bị bỏ qua.
         """
-        logging.info(f"Watching local file queue: {self.queue_file}...")
-        
-        while True:
-            try:
-                # 1. Đọc file
-                if not os.path.exists(self.queue_file):
-                    time.sleep(1)
+        batch, rest = [], []
+        for entry in messages:
+            if len(batch) < self.batch_size:
+                if isinstance(entry, dict) and NOT_BEFORE_KEY in entry:
+                    if entry[NOT_BEFORE_KEY] <= now:
+                        batch.append(entry.get(MESSAGE_KEY))
+                        continue
+                else:
+                    batch.append(entry)
                     continue
+            rest.append(entry)
+        return batch, rest
 
-                with open(self.queue_file, 'r') as f:
-                    try:
-                        messages = json.load(f)
-                    except json.JSONDecodeError:
-                        messages = []
+    def _start_batch(self, raws: List[bytes]):
+        """Ghi lô vừa lấy ra vào sidecar (mỗi dòng một message, bytes gốc) và bắt đầu file đánh dấu."""
+        self._write_atomic(self.inflight_file, b"\n".join(raws))
+        self._done = open(self.done_file, 'wb')
 
-                # 2. Kiểm tra có tin nhắn không
-                if not messages:
-                    time.sleep(1) # Nghỉ 1 giây rồi quét tiếp
-                    continue
+    def _mark_done(self, index: int):
+        """Message thứ index của lô đã xử lý xong (đã ack hoặc đã được ghi lại vào queue)."""
+        if self._done is not None:
+            self._done.write(f"{index}\n".encode())
+            self._done.flush()
+
+    def _finish_batch(self):
+        """Ghi các message lỗi của lô vào cuối queue (một lần cho cả lô) rồi xoá sidecar."""
+        self.flush_requeued()
+        if self._requeued:
+            # Chưa ghi lại được vào queue: giữ sidecar để khôi phục ở lần khởi động sau
+            return
+        self._remove_inflight()
+
+    def _remove_inflight(self):
+        if self._done is not None:
+            self._done.close()
+            self._done = None
+        for path in (self.done_file, self.inflight_file):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
-                # 3. Lấy tin nhắn đầu tiên (FIFO)
-                raw_data = messages.pop(0)
+    def recover(self) -> int:
+        """
+        Đưa các message của lô dở dang (process chết khi đang xử lý) trở lại đầu queue.
+        Message đang xử lý dở lúc process chết sẽ được xử lý lại (at-least-once).
+
+        :return: Số message được khôi phục.
+        """
+        if not os.path.exists(self.inflight_file):
+            return 0
+        with open(self.inflight_file, 'rb') as f:
+            lines = f.read().split(b"\n")
+        done = set()
+        if os.path.exists(self.done_file):
+            with open(self.done_file, 'rb') as f:
+                # Bỏ dòng cuối chưa có "\n" (ghi dở lúc process chết)
+                done = {int(index) for index in f.read().split(b"\n")[:-1] if index}
 
-                # 4. Ghi lại file (đã loại bỏ tin nhắn vừa lấy)
-                # Đây là hành động mô phỏng việc "nhận" message
-                with open(self.queue_file, 'w') as f:
-                    json.dump(messages, f, indent=2)
+        pending = [codec.loads(line) for index, line in enumerate(lines) if line and index not in done]
+        if pending:
+            messages = self._read_queue()
+            if messages is None:
+                return 0
+            self._write_queue(pending + messages)
+            logging.warning(f"Recovered {len(pending)} unfinished messages from {self.inflight_file}")
+        self._remove_inflight()
+        return len(pending)
 
-                # 5. Đóng gói vào MockMessage và gọi Callback
-                mock_msg = MockMessage(raw_data)
-                
-                # Gọi hàm xử lý logic chính (của ETL)
-                logging.info(f"Processing message: {raw_data}")
-                callback(mock_msg)
+    def poll(self, callback: Callable) -> bool:
+        """
+        Lấy một lô message đã đến hạn và gọi callback cho từng message.
 
+        :return: False nếu không có message nào để xử lý.
+        """
+        # 1. Đọc file
+        if not os.path.exists(self.queue_file):
+            return False
+
+        messages = self._read_queue()
+        if not messages:
+            return False
+
+        # 2. Lấy một lô tin nhắn đầu tiên đã đến hạn (FIFO)
+        batch, rest = self._claim(messages, time.time())
+        if not batch:
+            return False # Chỉ còn message đang chờ hẹn giờ re-queue
+
+        # 3. Ghi lô vào sidecar trước, rồi mới ghi lại queue (đã loại bỏ các tin nhắn vừa lấy).
+        # Process chết giữa hai bước chỉ làm message bị xử lý lại, không bị mất.
+        # Bytes gốc được giữ lại: transform có thể sửa dict tại chỗ trước khi lỗi,
+        # message re-queue và báo lỗi phải lấy từ bản chưa bị sửa
+        raws = [codec.dumps(raw_data) for raw_data in batch]
+        self._start_batch(raws)
+        self._write_queue(rest)
+
+        # 4. Đóng gói vào MockMessage và gọi Callback cho từng tin nhắn
+        for index, (raw_data, raw) in enumerate(zip(batch, raws)):
+            # Gọi hàm xử lý logic chính (của ETL)
+            logging.debug("Processing message: %s", raw_data)
+            self._claim_index = index
+            requeued = len(self._requeued)
+            try:
+                callback(MockMessage(raw_data, raw=raw, topic=self.topic))
             except Exception as e:
-                logging.error(f"Error in local file poll: {e}")
-                time.sleep(1)
+                # Một message lỗi không được làm mất phần còn lại của lô
+                logging.error(f"Error processing message: {e}")
+            finally:
+                self._claim_index = None
+            # Message re-queue chỉ được đánh dấu xong khi đã thật sự được ghi lại vào queue
+            if len(self._requeued) == requeued:
+                self._mark_done(index)
+
+        # 5. Ghi các message lỗi vào cuối queue và xoá sidecar
+        self._finish_batch()
+        return True
+
+    def subscribe(self, callback: Callable):
+        """
+        Thay vì streaming từ Google, ta dùng vòng lặp để đọc file JSON.
+        """
+        logging.info(f"Watching local file queue: {self.queue_file}...")
+        self.recover()
+
+        try:
+            while True:
+                try:
+                    if not self.poll(callback):
+                        time.sleep(1) # Nghỉ 1 giây rồi quét tiếp
+                except Exception as e:
+                    logging.error(f"Error in local file poll: {e}")
+                    time.sleep(1)
+        finally:
+            # Dừng (vd. Ctrl+C) thì không làm mất các message đang chờ re-queue
+            self.flush_requeued()
+
+    def flush_requeued(self) -> None:
+        """Ghi ngay các message re-queue còn giữ trong bộ nhớ vào cuối file queue."""
+        if not self._requeued:
+            return
+        messages = self._read_queue()
+        if messages is None:
+            return
+        requeued, self._requeued = self._requeued, []
+        self._write_queue(messages + [record for _, record in requeued])
+        for index, _ in requeued:
+            if index is not None:
+                self._mark_done(index)
 
     def parse_message(self, message: MockMessage) -> dict:
         """
-        Giải mã message từ MockMessage (bytes -> dict)
+        Lấy nội dung đã decode của MockMessage (decode bytes nếu chưa có, chỉ một lần)
         """
         try:
-            return json.loads(message.data.decode("utf-8")) if message.data else {}
-        except json.JSONDecodeError as e:
+            return message.value
+        except codec.decode_errors as e:
             logging.error(f"Failed to parse message: {e}")
             raise e
         
+    def original_message(self, message: MockMessage) -> dict:
+        """
+        Decode lại message từ bytes gốc. Khác parse_message, kết quả không bị ảnh hưởng
+        nếu transform đã sửa dict đầu vào tại chỗ (dùng khi re-queue và báo lỗi).
+        """
+        return codec.loads(message.data)
+
     def acknowledge_message(self, message: MockMessage):
         """
         Gọi hàm ack của MockMessage
@@ -113,31 +294,23 @@ class LocalFileSubscriber(Subscriber):
             logging.error(f"Failed to acknowledge message: {e}")
             raise e
 
-    def handle_error_message(self, message: MockMessage):
+    def handle_error_message(self, message: MockMessage, delay: float = 0):
         """
         Nếu lỗi, ta có thể ghi lại message vào cuối file queue (Re-queue)
+
+        :param delay: Số giây trước khi message được lấy ra xử lý lại. Chỉ message này bị hoãn,
+                      các message khác trong queue vẫn được xử lý bình thường.
         """
         try:
             logging.error("Handling error message - Re-queueing to file...")
             
-            # Decode lại data để ghi vào JSON
-            data_dict = json.loads(message.data.decode("utf-8"))
-            
-            # Đọc queue hiện tại
-            current_messages = []
-            if os.path.exists(self.queue_file):
-                with open(self.queue_file, 'r') as f:
-                    try:
-                        current_messages = json.load(f)
-                    except:
-                        current_messages = []
-            
-            # Thêm lại vào cuối hàng đợi
-            current_messages.append(data_dict)
-            
-            with open(self.queue_file, 'w') as f:
-                json.dump(current_messages, f, indent=2)
-                
+            # Không đọc/ghi lại cả file cho mỗi lỗi: message (bản gốc, không phải dict transform
+            # có thể đã sửa) được giữ lại và ghi vào cuối hàng đợi một lần khi xử lý xong cả lô
+            original = self.original_message(message)
+            if delay > 0:
+                original = {NOT_BEFORE_KEY: time.time() + delay, MESSAGE_KEY: original}
+            self._requeued.append((self._claim_index, original))
+
             message.ack() # Ack để báo là đã xử lý việc lỗi xong
             
         except Exception as e:
@@ -1,27 +1,124 @@
 import importlib.util
 import sys
 import os
+import marshal
+import linecache
 import logging
-from typing import Callable
+import types
+from typing import Callable, Optional
+
+# Bố cục kho phiên bản (xem transform_store.py phía Agent)
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+SOURCE_FILE = "source.py"
+CODE_FILENAME = "function.py"
+
+def _with_filename(code: types.CodeType, filename: str) -> types.CodeType:
+    """Đổi co_filename của code object (và các hàm lồng bên trong) sang tên khác."""
+    consts = tuple(
+        _with_filename(const, filename) if isinstance(const, types.CodeType) else const
+        for const in code.co_consts
+    )
+    return code.replace(co_filename=filename, co_consts=consts)
 
 class Transformer:
-    def __init__(self, function_path: str = "function.py"):
+    def __init__(self, function_path: str = "function.py", store_path: Optional[str] = None,
+                 code_filename: str = CODE_FILENAME):
         """
         :param function_path: Đường dẫn tới file chứa hàm transform (file này sẽ bị thay đổi bởi Agent).
+        :param store_path: Thư mục kho phiên bản transform do Agent quản lý. Khi kho đã có
+                           phiên bản CURRENT thì dùng kho, ngược lại dùng function_path.
+        :param code_filename: Tên file hiển thị trong traceback cho code nạp từ kho. Mỗi route
+                              cần một tên riêng (vd. "orders/function.py") để không lẫn source.
         """
         # Nếu chạy trong Docker/Local, ta cần đảm bảo đường dẫn đúng.
         # Ở đây giả định file function.py nằm cùng thư mục với script này.
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.module_path = os.path.join(current_dir, function_path)
+        self.store_path = os.path.join(current_dir, store_path) if store_path else None
+        self.code_filename = code_filename
+
+        # Hàm transform đã nạp và "dấu vân tay" (stat) của nguồn đã nạp nó
+        self._loaded_from = None
+        self._transform = None
+        self.version = None
 
     def create(self) -> Callable:
         """
-        Load hàm 'transform' từ file python bên ngoài một cách động (Dynamic Import).
-        Điều này cho phép thay đổi logic code mà không cần build lại Image.
+        Trả về hàm 'transform' mới nhất.
+        Chỉ stat file CURRENT (hoặc function.py) ở mỗi lần gọi; code chỉ được nạp lại khi file
+        thay đổi. Điều này cho phép thay đổi logic code mà không cần build lại Image.
         """
+        if self.store_path:
+            pointer = os.path.join(self.store_path, CURRENT_POINTER)
+            try:
+                st = os.stat(pointer)
+            except FileNotFoundError:
+                st = None
+            if st is not None:
+                stamp = (pointer, st.st_ino, st.st_mtime_ns)
+                if stamp != self._loaded_from:
+                    self._load_version(pointer)
+                    self._loaded_from = stamp
+                return self._transform
+
         if not os.path.exists(self.module_path):
             raise FileNotFoundError(f"Transformation file not found at: {self.module_path}")
 
+        st = os.stat(self.module_path)
+        stamp = (self.module_path, st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._loaded_from:
+            self._load_file()
+            self._loaded_from = stamp
+        return self._transform
+
+    def read_source(self) -> str:
+        """Source của function_path, dùng để Agent khởi tạo kho khi kho của route còn trống."""
+        with open(self.module_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _load_version(self, pointer: str):
+        """Nạp phiên bản mà CURRENT trỏ tới, ưu tiên bytecode đã compile sẵn."""
+        try:
+            with open(pointer, "r") as f:
+                version = f.read().strip()
+            version_dir = os.path.join(self.store_path, VERSIONS_DIR, version)
+
+            with open(os.path.join(version_dir, SOURCE_FILE), "r", encoding="utf-8") as f:
+                source = f.read()
+            # Để traceback gửi cho Agent hiển thị đúng dòng code của phiên bản này
+            linecache.cache[self.code_filename] = (len(source), None, source.splitlines(True), self.code_filename)
+
+            bytecode_path = os.path.join(version_dir, f"{sys.implementation.cache_tag}.bin")
+            if os.path.exists(bytecode_path):
+                with open(bytecode_path, "rb") as f:
+                    code = marshal.load(f)
+                if self.code_filename != CODE_FILENAME:
+                    code = _with_filename(code, self.code_filename)
+            else:
+                # Agent chạy phiên bản Python khác, compile lại từ source
+                code = compile(source, self.code_filename, "exec")
+
+            module = types.ModuleType("dynamic_transform_module")
+            module.__file__ = self.code_filename
+            exec(code, module.__dict__)
+            sys.modules["dynamic_transform_module"] = module
+
+            if not hasattr(module, "transform"):
+                raise AttributeError(f"Function 'transform' not found in transform version {version}")
+
+            self._transform = module.transform
+            self.version = version
+            logging.info(f"Switched to transform version {version}")
+
+        except Exception as e:
+            logging.error(f"Failed to load transformation function: {e}")
+            raise e
+
+    def _load_file(self):
+        """
+        Load hàm 'transform' từ file python bên ngoài một cách động (Dynamic Import).
+        """
         try:
             # 1. Tạo spec để load module từ đường dẫn file
             spec = importlib.util.spec_from_file_location("dynamic_transform_module", self.module_path)
@@ -30,7 +127,7 @@ class Transformer:
 
             # 2. Tạo module từ spec
             module = importlib.util.module_from_spec(spec)
-            
+
             # 3. Thực thi module (để định nghĩa các hàm bên trong nó)
             sys.modules["dynamic_transform_module"] = module
             spec.loader.exec_module(module)
@@ -39,9 +136,10 @@ class Transformer:
             if not hasattr(module, "transform"):
                 raise AttributeError(f"Function 'transform' not found in {self.module_path}")
 
+            self._transform = module.transform
+            self.version = None
             logging.info(f"Successfully loaded transformation logic from {self.module_path}")
-            return module.transform
 
         except Exception as e:
             logging.error(f"Failed to load transformation function: {e}")
-            raise e
\ No newline at end of file
+            raise e
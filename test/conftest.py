@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Các module của Pipeline và Agent được import theo tên file (chạy trong container với WORKDIR /app)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for service in ("pipeline", "agent"):
+    path = os.path.join(ROOT, "src", service)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,118 @@
+import asyncio
+import importlib
+import json
+
+import httpx
+import pytest
+
+from repair_queue import RepairJob, failure_signature
+from transform_store import TransformStore
+
+BROKEN = "def transform(data):\n    return {'age': int(data['age'])}\n"
+FIXED = "def transform(data):\n    return {'age': int(data['age']) if str(data['age']).isdigit() else None}\n"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # Đường dẫn kho/cache của Agent được đọc từ env lúc import
+    root = tmp_path_factory.mktemp("agent")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TRANSFORM_STORE_PATH", str(root / "transforms"))
+        mp.setenv("REPAIR_CACHE_DIR", str(root / "cache"))
+        mp.setenv("GOOD_CORPUS_PATH", str(root / "good_corpus.jsonl"))
+        yield importlib.import_module("app")
+
+
+def make_job(version):
+    report = {
+        "error": "ValueError: invalid literal for int() with base 10: 'x'",
+        "traceback": 'File "function.py", line 2, in transform\n',
+        "payload_data": {"age": "x"},
+        "version": version,
+    }
+    return RepairJob(failure_signature(report), report)
+
+
+def run_job(app, monkeypatch, tmp_path, job, current):
+    store = TransformStore(str(tmp_path))
+    broken = store.publish(BROKEN, origin="seed")
+    if current == "fixed":
+        store.publish(FIXED, origin="ollama", parent=broken)
+    monkeypatch.setattr(app, "get_transform_store", lambda route: store)
+
+    async def no_candidates(job, current_code):
+        return []
+    monkeypatch.setattr(app, "generate_candidates", no_candidates)
+    return asyncio.run(app.run_self_healing(job)), broken
+
+
+def test_repair_is_skipped_when_a_newer_version_handles_the_failure(app, monkeypatch, tmp_path):
+    job = make_job(TransformStore.version_id(BROKEN))
+    result, _ = run_job(app, monkeypatch, tmp_path, job, current="fixed")
+    assert result == ("fixed", "already fixed by current version")
+
+
+def test_repair_runs_when_the_failing_version_is_still_current(app, monkeypatch, tmp_path):
+    # Example rút gọn có thể chạy qua trên chính phiên bản đã lỗi: vẫn phải sửa
+    job = make_job(TransformStore.version_id(BROKEN))
+    job.examples = [{"age": "1"}]
+    result, _ = run_job(app, monkeypatch, tmp_path, job, current="broken")
+    assert result == ("failed", "AI did not return any valid python code")
+
+
+def ollama_stream(app, monkeypatch, chunks):
+    """Chạy call_ollama_to_fix với Ollama giả trả các chunk NDJSON; trả về (text, số chunk đã gửi)."""
+    sent = []
+
+    async def body():
+        for chunk in chunks:
+            sent.append(chunk)
+            yield (json.dumps(chunk) + "\n").encode()
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(app, "ollama_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    text = asyncio.run(app.call_ollama_to_fix("KeyError: 'age'", "", BROKEN, [{"name": "a"}]))
+    return text, len(sent)
+
+
+def test_ollama_stream_stops_when_a_split_fence_closes(app, monkeypatch):
+    chunks = [
+        {"response": "Here:\n``", "done": False},
+        {"response": "`python\ndef transform(data):\n", "done": False},
+        {"response": "    return data\n`", "done": False},
+        {"response": "``", "done": False},
+        {"response": "\nExplanation that is never needed.", "done": False},
+        {"response": "", "done": True},
+    ]
+    text, sent = ollama_stream(app, monkeypatch, chunks)
+
+    assert text == "Here:\n```python\ndef transform(data):\n    return data\n```"
+    assert sent == 4
+
+
+def test_ollama_stream_stops_on_done(app, monkeypatch):
+    chunks = [
+        {"response": "```python\ndef transform(data):\n", "done": False},
+        {"response": "    return data\n", "done": True},
+        {"response": "```", "done": False},
+    ]
+    text, sent = ollama_stream(app, monkeypatch, chunks)
+
+    assert text == "```python\ndef transform(data):\n    return data\n"
+    assert sent == 2
+
+
+def test_ollama_stream_without_code_block_reads_until_done(app, monkeypatch):
+    chunks = [
+        {"response": "I cannot ", "done": False},
+        {"response": "fix this ```", "done": False},
+        {"response": "code.", "done": False},
+        {"response": "", "done": True},
+    ]
+    text, sent = ollama_stream(app, monkeypatch, chunks)
+
+    assert text == "I cannot fix this ```code."
+    assert sent == 4
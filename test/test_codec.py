@@ -0,0 +1,74 @@
+import pytest
+
+import codec
+from subscriber import LocalFileSubscriber, MockMessage
+
+
+class MissingCodec(codec.Codec):
+    name = "missing"
+
+    def __init__(self):
+        raise ImportError("not installed")
+
+
+@pytest.fixture
+def missing_codec(monkeypatch):
+    monkeypatch.setitem(codec._CODECS, "missing", MissingCodec)
+
+
+def test_named_codec_falls_back_to_json(missing_codec):
+    assert type(codec.get_codec("missing")) is codec.Codec
+    assert type(codec.get_codec("unknown")) is codec.Codec
+    assert codec.get_codec("JSON").name == "json"
+
+
+def test_default_codec_skips_codecs_that_are_not_installed(missing_codec, monkeypatch):
+    monkeypatch.setattr(codec, "CODEC_PREFERENCE", ("missing", "json"))
+    assert codec.get_codec().name == "json"
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgspec"])
+def test_codecs_round_trip_compact_utf8(name):
+    selected = codec.get_codec(name)
+    if selected.name != name:
+        pytest.skip(f"{name} is not installed")
+
+    record = {"name": "Nguyễn", "tags": [1, 2.5, None, True]}
+    encoded = selected.dumps(record)
+    assert encoded == '{"name":"Nguyễn","tags":[1,2.5,null,true]}'.encode("utf-8")
+    assert selected.loads(encoded) == record
+    with pytest.raises(selected.decode_errors):
+        selected.loads(b"{broken")
+
+
+def test_mock_message_decodes_and_encodes_lazily():
+    message = MockMessage(raw=b'{"a":1}')
+    assert message._decoded is None
+    assert message.value == {"a": 1}
+
+    message = MockMessage({"a": 1})
+    assert message._raw is None
+    assert codec.codec.loads(message.data) == {"a": 1}
+
+
+def test_undecodable_queue_is_left_untouched(tmp_path, monkeypatch):
+    queue_file = tmp_path / "messages.json"
+    queue_file.write_bytes(b'[{"a": 1}, broken')
+    subscriber = LocalFileSubscriber(str(queue_file))
+
+    assert subscriber._read_queue() is None
+    subscriber.handle_error_message(MockMessage({"b": 2}))
+    subscriber.flush_requeued()
+    assert queue_file.read_bytes() == b'[{"a": 1}, broken'
+
+
+def test_requeued_messages_are_buffered_until_the_next_write(tmp_path):
+    queue_file = tmp_path / "messages.json"
+    queue_file.write_text('[{"id": 1}, {"id": 2}]')
+    subscriber = LocalFileSubscriber(str(queue_file))
+
+    subscriber.handle_error_message(MockMessage({"id": 0}))
+    # Re-queue không ghi file ngay, chỉ gộp vào lần ghi kế tiếp
+    assert codec.codec.loads(queue_file.read_bytes()) == [{"id": 1}, {"id": 2}]
+    subscriber.flush_requeued()
+    assert codec.codec.loads(queue_file.read_bytes()) == [{"id": 1}, {"id": 2}, {"id": 0}]
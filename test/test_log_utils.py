@@ -0,0 +1,128 @@
+import logging
+import logging.handlers
+import queue
+
+import pytest
+
+import log_utils
+from log_utils import MessageStats, RateLimitFilter, _DeferredQueueHandler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(log_utils.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def rate_limited(clock, caplog):
+    """caplog với RateLimitFilter gắn vào handler, giống setup_logging."""
+    log_filter = RateLimitFilter(per_interval=5, interval=10)
+    caplog.handler.addFilter(log_filter)
+    caplog.set_level(logging.INFO)
+    yield log_filter
+    caplog.handler.removeFilter(log_filter)
+
+
+def test_rate_limit_drops_repeats_within_the_window(rate_limited, caplog):
+    for i in range(8):
+        logging.error("Loading error: %s", i)
+    logging.error("Other error")
+
+    assert [r.getMessage() for r in caplog.records] == [f"Loading error: {i}" for i in range(5)] + ["Other error"]
+
+
+def test_next_window_reports_the_suppressed_count(rate_limited, clock, caplog):
+    for i in range(8):
+        logging.error("Loading error: %s", i)
+    clock.now += 10
+    logging.error("Loading error: %s", "late")
+
+    assert caplog.records[-1].getMessage() == "Loading error: late (+3 similar messages suppressed)"
+    # Đã báo thì không báo lại
+    logging.error("Loading error: %s", "again")
+    assert caplog.records[-1].getMessage() == "Loading error: again"
+
+
+def test_window_does_not_reset_early(rate_limited, clock, caplog):
+    for i in range(5):
+        logging.error("Loading error: %s", i)
+    clock.now += 9.9
+    logging.error("Loading error: %s", "still limited")
+
+    assert len(caplog.records) == 5
+
+
+def test_drain_returns_and_clears_unreported_counts(rate_limited, caplog):
+    for i in range(7):
+        logging.error("Loading error: %s", i)
+
+    assert rate_limited.drain() == {("root", "Loading error: %s"): 2}
+    assert rate_limited.drain() == {}
+
+
+def test_deferred_handler_snapshots_mutable_args():
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+    record_data = {"name": "a"}
+    record = logging.LogRecord("root", logging.ERROR, __file__, 1, "payload: %s", (record_data,), None)
+
+    prepared = handler.prepare(record)
+    # Thread ETL sửa tiếp dict sau khi đã log
+    record_data["age"] = 1
+
+    assert prepared.msg == "payload: {'name': 'a'}"
+    assert prepared.args is None
+    assert prepared.getMessage() == "payload: {'name': 'a'}"
+    # Không sửa record gốc (các handler khác vẫn dùng được)
+    assert record.msg == "payload: %s"
+
+
+def test_flush_logs_one_line_per_route_and_resets_counts(caplog):
+    caplog.set_level(logging.INFO)
+    stats = MessageStats(interval=30)
+    stats.record("ok", "users")
+    stats.record("ok", "users")
+    stats.record("failed", "users")
+    stats.record("ok", "orders")
+    stats.flush()
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "Pipeline[orders]: 1 messages in the last 30s (ok=1)",
+        "Pipeline[users]: 3 messages in the last 30s (failed=1, ok=2)",
+    ]
+    assert stats.totals() == {"users": {"ok": 2, "failed": 1}, "orders": {"ok": 1}}
+
+    caplog.clear()
+    stats.flush()
+    assert caplog.records == []
+
+
+def test_summary_lines_of_every_route_bypass_the_rate_limit(rate_limited, caplog):
+    stats = MessageStats(interval=30)
+    for i in range(8):
+        stats.record("ok", f"route{i}")
+    stats.flush()
+
+    assert [r.getMessage().split(":")[0] for r in caplog.records] == [f"Pipeline[route{i}]" for i in range(8)]
+
+
+def test_flush_reports_suppressed_logs_that_never_repeated(rate_limited, caplog):
+    for i in range(8):
+        logging.error("Loading error: %s", i)
+    caplog.clear()
+
+    MessageStats(interval=30).flush()
+
+    assert [r.getMessage() for r in caplog.records] == [
+        "Pipeline: 3 log messages suppressed (3x 'Loading error: %s')"
+    ]
+    assert rate_limited.drain() == {}
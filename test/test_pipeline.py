@@ -0,0 +1,72 @@
+import time
+
+from codec import codec
+from pipeline import Pipeline
+from router import Route, TransformRegistry
+from subscriber import NOT_BEFORE_KEY, LocalFileSubscriber, MockMessage
+
+
+class StubTransformer:
+    version = None
+
+    def __init__(self, transform):
+        self.transform = transform
+
+    def create(self):
+        return self.transform
+
+    def read_source(self):
+        return ""
+
+
+class RecordingHook:
+    def __init__(self):
+        self.reports = []
+
+    def call_agent_hook(self, error, payload_data, seed_code=None, version=None):
+        self.reports.append(payload_data)
+
+    def record_success(self, payload_data):
+        pass
+
+
+def rename_then_fail(data):
+    data["age_raw"] = data.pop("age")
+    raise ValueError("bad age")
+
+
+def test_failed_message_is_requeued_and_reported_unmodified(tmp_path):
+    queue_file = tmp_path / "messages.json"
+    subscriber = LocalFileSubscriber(str(queue_file))
+    hook = RecordingHook()
+    route = Route("people", StubTransformer(rename_then_fail), loader=None, agent_hook=hook)
+    pipeline = Pipeline(subscriber, registry=TransformRegistry([route], default="people"))
+    pipeline._initialize()
+
+    record = {"name": "a", "age": "x"}
+    pipeline.wrapped_callback(MockMessage(record, raw=codec.dumps(record)))
+    subscriber.flush_requeued()
+
+    assert hook.reports == [{"name": "a", "age": "x"}]
+    assert codec.loads(queue_file.read_bytes()) == [{"name": "a", "age": "x"}]
+
+
+def test_failed_message_is_delayed_without_blocking_others(tmp_path):
+    queue_file = tmp_path / "messages.json"
+    subscriber = LocalFileSubscriber(str(queue_file), batch_size=1)
+    route = Route("people", StubTransformer(rename_then_fail), loader=None, agent_hook=RecordingHook())
+    pipeline = Pipeline(subscriber, registry=TransformRegistry([route], default="people"), error_delay=60)
+    pipeline._initialize()
+
+    started = time.monotonic()
+    record = {"name": "a", "age": "x"}
+    pipeline.wrapped_callback(MockMessage(record, raw=codec.dumps(record)))
+    assert time.monotonic() - started < 1
+
+    _, delayed = subscriber._requeued[0]
+    assert delayed[NOT_BEFORE_KEY] > time.time() + 50
+    # Message hẹn giờ chưa tới hạn bị bỏ qua, message phía sau vẫn được lấy ra
+    batch, rest = subscriber._claim([delayed, {"id": 1}, {"id": 2}], time.time())
+    assert batch == [{"id": 1}] and rest == [delayed, {"id": 2}]
+    batch, rest = subscriber._claim(rest, delayed[NOT_BEFORE_KEY])
+    assert batch == [{"name": "a", "age": "x"}] and rest == [{"id": 2}]
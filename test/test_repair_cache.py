@@ -0,0 +1,55 @@
+import os
+
+from repair_cache import RepairCache
+
+CODE = "def transform(data):\n    return data\n"
+
+
+def age(cache, key, seconds):
+    path = cache._path(key)
+    mtime = os.stat(path).st_mtime - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_key_depends_on_code_signature_and_input_keys():
+    key = RepairCache.make_key(CODE, "sig", {"a": 1, "b": 2})
+
+    assert key == RepairCache.make_key(CODE + "\n\n", "sig", {"b": 3, "a": 4})
+    assert key != RepairCache.make_key(CODE.replace("data", "row"), "sig", {"a": 1, "b": 2})
+    assert key != RepairCache.make_key(CODE, "other", {"a": 1, "b": 2})
+    assert key != RepairCache.make_key(CODE, "sig", {"a": 1})
+
+
+def test_put_get_delete(tmp_path):
+    cache = RepairCache(str(tmp_path))
+
+    assert cache.get("missing") is None
+    cache.put("k", "fixed", signature="sig")
+    assert cache.get("k") == "fixed"
+    cache.delete("k")
+    assert cache.get("k") is None
+
+
+def test_corrupted_entry_is_dropped(tmp_path):
+    cache = RepairCache(str(tmp_path))
+    with open(cache._path("k"), "w") as f:
+        f.write("{not json")
+
+    assert cache.get("k") is None
+    assert not os.path.exists(cache._path("k"))
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = RepairCache(str(tmp_path), max_entries=2)
+    cache.put("old", "1")
+    cache.put("used", "2")
+    age(cache, "old", 20)
+    age(cache, "used", 30)
+
+    # Đọc "used" làm mới thứ tự LRU, entry thứ 3 đẩy "old" ra khỏi cache
+    assert cache.get("used") == "2"
+    cache.put("new", "3")
+
+    assert cache.get("old") is None
+    assert cache.get("used") == "2"
+    assert cache.get("new") == "3"
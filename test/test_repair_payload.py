@@ -0,0 +1,119 @@
+import gzip
+import json
+
+from agent_hook import AgentHook, failure_key
+from repair_payload import RepairPayloadBuilder
+
+FUNCTION_SOURCE = """
+def transform(data):
+    return {"birth_year": 2024 - int(data["age"])}
+"""
+
+
+def load_transform():
+    # Code compile với tên function.py giống code nạp từ kho phiên bản
+    namespace = {}
+    exec(compile(FUNCTION_SOURCE, "function.py", "exec"), namespace)
+    return namespace["transform"]
+
+
+def build_report(builder, payload):
+    try:
+        load_transform()(payload)
+    except Exception as e:
+        return builder.build(e, payload)
+    raise AssertionError("transform should have failed")
+
+
+def test_elide_truncates_values_but_keeps_types_and_keys():
+    builder = RepairPayloadBuilder(max_value_chars=5, max_items=2)
+    nested = {f"k{i}": {"deeper": {"deepest": "y" * 10}} for i in range(8)}
+    elided = builder.elide({
+        "bio": "x" * 100,
+        "age": 42,
+        "tags": ["a", "b", "c"],
+        "addr": nested,
+    })
+
+    assert elided["bio"] == "xxxxx..."
+    assert elided["age"] == 42
+    assert elided["tags"] == ["a", "b"]
+    # Dict ở mọi độ sâu giữ đủ key, chỉ giá trị bị cắt
+    assert list(elided["addr"]) == list(nested)
+    assert elided["addr"]["k7"] == {"deeper": {"deepest": "yyyyy..."}}
+
+
+def test_trim_traceback_keeps_only_function_frames():
+    builder = RepairPayloadBuilder()
+    report = build_report(builder, {"age": "abc"})
+
+    assert 'File "function.py"' in report["traceback"]
+    assert "test_repair_payload.py" not in report["traceback"]
+    assert report["traceback"].rstrip().endswith("invalid literal for int() with base 10: 'abc'")
+
+
+def test_build_reports_schema_diff_against_last_good_record():
+    builder = RepairPayloadBuilder(good_samples=2, max_value_chars=3)
+
+    first = build_report(builder, {"age": "abc"})
+    assert first["schema_diff"] == {"known_good": False, "current": {"age": "str"}}
+
+    good = {"age": 30, "name": "alice"}
+    builder.observe_good(json.dumps(good).encode("utf-8"))
+    # Dict đầu vào bị transform sửa sau đó không ảnh hưởng tới bản đã ghi nhận (bytes)
+    good["name"] = "changed"
+    report = build_report(builder, {"age": "abc", "lang": "vi"})
+
+    assert report["error"].startswith("ValueError: ")
+    assert report["schema_diff"] == {
+        "known_good": True,
+        "added": {"lang": "str"},
+        "removed": {"name": "str"},
+        "type_changed": {"age": ["int", "str"]},
+    }
+    # Record tốt được gửi nguyên vẹn để Agent kiểm tra hồi quy
+    assert report["good_samples"] == [{"age": 30, "name": "alice"}]
+
+
+def test_encode_gzips_large_bodies_only():
+    builder = RepairPayloadBuilder(compress=True, gzip_min_bytes=100)
+
+    body, headers = builder.encode({"error": "x"})
+    assert "Content-Encoding" not in headers
+    assert json.loads(body) == {"error": "x"}
+
+    body, headers = builder.encode({"error": "x" * 500})
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body)) == {"error": "x" * 500}
+
+
+def test_failure_key_ignores_record_values():
+    builder = RepairPayloadBuilder()
+    first = build_report(builder, {"age": "abc"})
+    second = build_report(builder, {"age": "xyz"})
+
+    assert failure_key(first) == failure_key(second)
+    assert failure_key(first, version="v1") != failure_key(first, version="v2")
+
+
+def test_agent_hook_reports_each_failure_once_per_window(monkeypatch):
+    hook = AgentHook("http://agent.invalid/transformation_error")
+    sent = []
+    monkeypatch.setattr(hook, "_post", lambda client, body, headers: sent.append(body) or True)
+
+    reported = []
+    for age in ("abc", "xyz", "abc"):
+        try:
+            load_transform()({"age": age})
+        except Exception as e:
+            reported.append(hook.call_agent_hook(e, {"age": age}))
+    try:
+        load_transform()({"age": "abc"})
+    except Exception as e:
+        # Phiên bản code mới: lỗi cùng loại vẫn được báo lại
+        reported.append(hook.call_agent_hook(e, {"age": "abc"}, version="v2"))
+
+    assert hook.flush(timeout=5)
+    assert reported == [True, False, False, True]
+    assert len(sent) == 2
+    assert hook.suppressed == 2
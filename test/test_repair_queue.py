@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from repair_queue import QueueFull, RepairQueue, failure_signature
+
+TRACEBACK = 'File "function.py", line {line}, in transform\n'
+
+
+def report(error, payload, line=4, route=None, removed=None):
+    return {
+        "error": error,
+        "traceback": TRACEBACK.format(line=line),
+        "payload_data": payload,
+        "schema_diff": {"known_good": True, "added": {}, "removed": removed or {}, "type_changed": {}},
+        "route": route,
+    }
+
+
+def test_signature_ignores_record_values():
+    first = report("ValueError: invalid literal for int() with base 10: 'abc'", {"age": "abc"})
+    second = report("ValueError: invalid literal for int() with base 10: 'x 42'", {"age": "x 42"})
+
+    assert failure_signature(first) == failure_signature(second)
+
+
+def test_signature_keeps_field_names_location_and_route():
+    missing_language = report("KeyError: 'language'", {"lang": "vi"}, removed={"language": "str"})
+    missing_name = report("KeyError: 'name'", {"lang": "vi"}, removed={"name": "str"})
+    assert failure_signature(missing_language) != failure_signature(missing_name)
+
+    other_line = report("KeyError: 'language'", {"lang": "vi"}, line=9, removed={"language": "str"})
+    assert failure_signature(missing_language) != failure_signature(other_line)
+
+    other_route = report("KeyError: 'language'", {"lang": "vi"}, route="orders", removed={"language": "str"})
+    assert failure_signature(missing_language) != failure_signature(other_route)
+
+
+def test_submit_coalesces_reports_with_the_same_signature():
+    async def handler(job):
+        return "fixed", ""
+
+    queue = RepairQueue(handler, maxsize=1, max_examples=2)
+    error = "ValueError: invalid literal for int() with base 10: '{}'"
+
+    job, coalesced = queue.submit(report(error.format("a"), {"age": "a"}))
+    assert not coalesced
+
+    for value in ("b", "a", "c"):
+        same_job, coalesced = queue.submit(report(error.format(value), {"age": value}))
+        assert coalesced and same_job is job
+
+    # Payload trùng bị bỏ, số example bị giới hạn bởi max_examples
+    assert job.reports == 4
+    assert job.examples == [{"age": "a"}, {"age": "b"}]
+
+    with pytest.raises(QueueFull):
+        queue.submit(report("KeyError: 'name'", {}, removed={"name": "str"}))
+
+
+def test_finished_job_releases_its_signature():
+    handled = []
+
+    async def handler(job):
+        handled.append(job.id)
+        return "fixed", "done"
+
+    async def scenario():
+        queue = RepairQueue(handler)
+        queue.start()
+        job, _ = queue.submit(report("KeyError: 'name'", {}))
+        await queue._queue.join()
+        next_job, coalesced = queue.submit(report("KeyError: 'name'", {}))
+        await queue.stop()
+        return job, next_job, coalesced
+
+    job, next_job, coalesced = asyncio.run(scenario())
+    assert job.status == "fixed" and handled == [job.id]
+    assert not coalesced and next_job is not job
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from codec import codec
+from loader import Loader
+from pipeline import Pipeline
+from router import Route, TransformRegistry
+from subscriber import LocalFileSubscriber, MockMessage
+
+
+def route(name, **match):
+    return Route(name, transformer=None, loader=None, agent_hook=None, **match)
+
+
+@pytest.fixture
+def registry():
+    return TransformRegistry(
+        [
+            route("people", values=["person"]),
+            route("orders", key_sets=[["id", "amount"]]),
+            route("events", topics=["events"]),
+            route("fallback"),
+        ],
+        discriminator="type",
+        default="fallback",
+    )
+
+
+def test_resolve_priority(registry):
+    # discriminator > tập key > topic > route mặc định
+    assert registry.resolve({"type": "person", "id": 1, "amount": 2}, "events").name == "people"
+    assert registry.resolve({"id": 1, "amount": 2}, "events").name == "orders"
+    assert registry.resolve({"type": "unknown", "x": 1}, "events").name == "events"
+    assert registry.resolve({"x": 1}, "messages").name == "fallback"
+    assert registry.resolve(["not", "a", "dict"], "events").name == "events"
+    assert registry.resolve({"type": ["unhashable"]}).name == "fallback"
+
+
+def test_resolve_without_default_returns_none():
+    registry = TransformRegistry([route("people", values=["person"])], discriminator="type")
+    assert registry.resolve({"type": "order"}) is None
+
+
+def test_invalid_routes_are_rejected():
+    for name in ("versions", "CURRENT", "../etc", ""):
+        with pytest.raises(ValueError):
+            route(name)
+    with pytest.raises(ValueError):
+        TransformRegistry([route("a", values=[1]), route("b", values=[1])], discriminator="type")
+    with pytest.raises(ValueError):
+        TransformRegistry([route("a")], default="missing")
+
+
+def test_from_config(tmp_path):
+    config = tmp_path / "routes.json"
+    config.write_text(json.dumps({
+        "discriminator": "type",
+        "routes": [{"name": "orders", "function": "orders.py", "values": ["order"], "topics": ["orders"]}],
+    }))
+
+    registry = TransformRegistry.from_config(str(config), "http://agent/transformation_error",
+                                             store_root=str(tmp_path / "transforms"), output_dir=str(tmp_path))
+
+    orders = registry.routes["orders"]
+    assert registry.resolve({"type": "order"}) is orders
+    assert orders.agent_hook.route == "orders"
+    assert orders.transformer.code_filename == "orders/function.py"
+    assert orders.loader.output_path == str(tmp_path / "orders.jsonl")
+    assert registry.default is None
+    assert registry.unrouted.output_path == str(tmp_path / "unrouted.jsonl")
+
+
+def test_unrouted_messages_are_dead_lettered_or_requeued(tmp_path):
+    queue_file = tmp_path / "messages.json"
+    subscriber = LocalFileSubscriber(str(queue_file))
+    people = route("people", values=["person"])
+    dead_letter = Loader(output_path=str(tmp_path / "unrouted.jsonl"))
+
+    pipeline = Pipeline(subscriber, registry=TransformRegistry([people], discriminator="type", unrouted=dead_letter))
+    pipeline._initialize()
+    pipeline.wrapped_callback(MockMessage({"other": 1}))
+    assert codec.loads((tmp_path / "unrouted.jsonl").read_bytes()) == {"other": 1}
+
+    # Không có dead-letter: message được giữ lại trong queue
+    pipeline = Pipeline(subscriber, registry=TransformRegistry([people], discriminator="type"))
+    pipeline._initialize()
+    pipeline.wrapped_callback(MockMessage({"other": 2}))
+    subscriber.flush_requeued()
+    assert codec.loads(queue_file.read_bytes()) == [{"other": 2}]
@@ -0,0 +1,62 @@
+import asyncio
+
+from sandbox import run_in_sandbox, run_records
+
+CODE = """
+def transform(data):
+    return {"name": data["name"].upper(), "age": int(data["age"])}
+"""
+
+
+def test_run_records_reports_each_record():
+    result = run_records(CODE, [{"name": "a", "age": "1"}, {"name": "b", "age": "x"}, {"age": 2}], repeat=3)
+
+    assert not result["ok"]
+    ok, bad_value, missing_key = result["results"]
+    assert ok["ok"] and ok["keys"] == ["age", "name"] and ok["ns"] > 0
+    assert bad_value == {
+        "ok": False,
+        "error_type": "ValueError",
+        "error": "ValueError: invalid literal for int() with base 10: 'x'",
+    }
+    assert missing_key["error_type"] == "KeyError"
+    assert result["per_record_ns"] == ok["ns"]
+
+
+def test_run_records_rejects_code_without_transform():
+    assert run_records("x = 1", [{}])["error"] == "ValueError: No 'transform' function found in the provided code."
+    assert run_records("def transform(:", [{}])["error"].startswith("SyntaxError")
+
+
+def test_run_in_sandbox_isolates_and_times_out():
+    passing = asyncio.run(run_in_sandbox(CODE, [{"name": "a", "age": 1}]))
+    assert passing["ok"] and passing["results"][0]["keys"] == ["age", "name"]
+
+    hanging = asyncio.run(run_in_sandbox("def transform(d):\n    while True: pass\n", [{}], timeout=1))
+    assert hanging == {"ok": False, "error": "Timeout: sandbox exceeded 1s", "results": []}
+
+
+SLOW_CODE = """
+import time
+
+def transform(data):
+    try:
+        time.sleep(data["seconds"])
+    except Exception:
+        pass
+    return {}
+"""
+
+
+def test_record_timeout_applies_to_each_run():
+    # 5 lần chạy x 0.05s vượt 0.15s tổng cộng, nhưng mỗi lần đều trong giới hạn
+    result = run_records(SLOW_CODE, [{"seconds": 0.05}], repeat=5, record_timeout=0.15)
+    assert result["ok"]
+
+
+def test_record_timeout_cannot_be_swallowed_by_transform():
+    result = run_records(SLOW_CODE, [{"seconds": 1}, {"seconds": 0}], record_timeout=0.1)
+
+    slow, fast = result["results"]
+    assert slow["error_type"] == "RecordTimeout"
+    assert fast["ok"]
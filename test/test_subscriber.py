@@ -0,0 +1,90 @@
+import os
+
+from codec import codec
+from subscriber import LocalFileSubscriber
+
+
+def make_subscriber(tmp_path, records, batch_size=100):
+    queue_file = tmp_path / "messages.json"
+    queue_file.write_bytes(codec.dumps(records))
+    return LocalFileSubscriber(str(queue_file), batch_size=batch_size)
+
+
+def read_queue(subscriber):
+    with open(subscriber.queue_file, "rb") as f:
+        return codec.loads(f.read())
+
+
+def test_queue_file_is_read_once_per_batch(tmp_path, monkeypatch):
+    subscriber = make_subscriber(tmp_path, [{"id": i} for i in range(10)], batch_size=5)
+    reads = []
+    read_queue_file = subscriber._read_queue
+    monkeypatch.setattr(subscriber, "_read_queue", lambda: reads.append(1) or read_queue_file())
+
+    seen = []
+    while subscriber.poll(lambda message: seen.append(message.value["id"])):
+        pass
+
+    assert seen == list(range(10))
+    # 2 lô + 1 lần đọc thấy queue rỗng
+    assert len(reads) == 3
+    assert read_queue(subscriber) == []
+    assert not os.path.exists(subscriber.inflight_file)
+    assert not os.path.exists(subscriber.done_file)
+
+
+def test_failed_messages_are_requeued_once_per_batch(tmp_path):
+    subscriber = make_subscriber(tmp_path, [{"id": 1}, {"id": 2}, {"id": 3}])
+
+    def callback(message):
+        if message.value["id"] % 2:
+            subscriber.handle_error_message(message)
+        else:
+            subscriber.acknowledge_message(message)
+
+    assert subscriber.poll(callback)
+    assert read_queue(subscriber) == [{"id": 1}, {"id": 3}]
+    assert not os.path.exists(subscriber.inflight_file)
+
+
+def test_unfinished_batch_is_recovered_after_a_crash(tmp_path):
+    subscriber = make_subscriber(tmp_path, [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}], batch_size=3)
+
+    class Crash(BaseException):
+        pass
+
+    def callback(message):
+        record = message.value
+        if record["id"] == 1:
+            subscriber.acknowledge_message(message)
+        elif record["id"] == 2:
+            # Re-queue chưa kịp ghi vào queue thì process chết
+            subscriber.handle_error_message(message)
+        else:
+            record["mutated"] = True
+            raise Crash()
+
+    try:
+        subscriber.poll(callback)
+    except Crash:
+        pass
+    assert read_queue(subscriber) == [{"id": 4}]
+
+    restarted = LocalFileSubscriber(subscriber.queue_file)
+    assert restarted.recover() == 2
+    # Message đã ack không bị xử lý lại; message dở dang trở lại đầu queue ở dạng gốc
+    assert read_queue(restarted) == [{"id": 2}, {"id": 3}, {"id": 4}]
+    assert not os.path.exists(restarted.inflight_file)
+    assert restarted.recover() == 0
+
+
+def test_recover_ignores_a_partially_written_done_marker(tmp_path):
+    subscriber = make_subscriber(tmp_path, [])
+    with open(subscriber.inflight_file, "wb") as f:
+        f.write(b"\n".join(codec.dumps({"id": i}) for i in range(12)))
+    with open(subscriber.done_file, "wb") as f:
+        # "11" mới ghi được một ký tự: không được hiểu thành message 1
+        f.write(b"0\n2\n1")
+
+    assert subscriber.recover() == 10
+    assert read_queue(subscriber)[:2] == [{"id": 1}, {"id": 3}]
@@ -0,0 +1,85 @@
+import traceback
+
+import pytest
+
+from transform_store import TransformStore
+from transformer import Transformer
+
+V1 = "def transform(data):\n    return {'v': 1}\n"
+V2 = "def transform(data):\n    return {'v': 2, 'n': data['n']}\n"
+
+
+def test_publish_and_rollback(tmp_path):
+    store = TransformStore(str(tmp_path))
+    assert store.current() is None
+
+    v1 = store.publish(V1, origin="seed")
+    v2 = store.publish(V2, origin="ollama", parent=v1, job_id="j1")
+
+    assert store.current() == v2
+    assert store.read_source() == V2
+    assert store.metadata(v2)["parent"] == v1 and store.metadata(v2)["job_id"] == "j1"
+    assert [meta["version"] for meta in store.versions()] == [v2, v1]
+    # Cùng nội dung thì cùng phiên bản, không tạo bản sao
+    assert store.publish(V2, origin="repair_cache", parent=v1) == v2
+    assert store.metadata(v2)["origin"] == "ollama"
+
+    assert store.rollback() == v1
+    assert store.current() == v1
+    with pytest.raises(ValueError):
+        store.rollback()
+    with pytest.raises(ValueError):
+        store.activate("unknown")
+
+
+def test_publish_rejects_invalid_source(tmp_path):
+    store = TransformStore(str(tmp_path))
+    with pytest.raises(SyntaxError):
+        store.publish("def transform(:", origin="ollama")
+    assert store.current() is None and store.versions() == []
+
+
+def test_transformer_reloads_only_when_current_changes(tmp_path):
+    function_file = tmp_path / "function.py"
+    function_file.write_text("def transform(data):\n    return {'v': 0}\n")
+    store = TransformStore(str(tmp_path / "transforms"))
+    transformer = Transformer(function_path=str(function_file), store_path=store.root)
+
+    # Kho còn trống: dùng function.py
+    assert transformer.create()({}) == {"v": 0}
+    assert transformer.version is None
+
+    v1 = store.publish(V1, origin="seed")
+    first = transformer.create()
+    assert first({}) == {"v": 1} and transformer.version == v1
+    assert transformer.create() is first
+
+    v2 = store.publish(V2, origin="ollama", parent=v1)
+    assert transformer.create()({"n": 3}) == {"v": 2, "n": 3} and transformer.version == v2
+
+    store.rollback()
+    assert transformer.create()({}) == {"v": 1} and transformer.version == v1
+
+
+def test_transformer_traceback_shows_version_source(tmp_path):
+    store = TransformStore(str(tmp_path))
+    store.publish(V2, origin="seed")
+    transformer = Transformer(function_path=str(tmp_path / "missing.py"), store_path=store.root,
+                              code_filename="orders/function.py")
+
+    with pytest.raises(KeyError) as excinfo:
+        transformer.create()({})
+
+    frame = traceback.extract_tb(excinfo.value.__traceback__)[-1]
+    assert frame.filename == "orders/function.py"
+    assert frame.line == "return {'v': 2, 'n': data['n']}"
+
+
+@pytest.mark.parametrize("version", ["..", ".", "../versions", "", "ABCDEF0123456789", None])
+def test_activate_rejects_invalid_version_ids(tmp_path, version):
+    store = TransformStore(str(tmp_path))
+    current = store.publish(V1, origin="seed")
+
+    with pytest.raises(ValueError):
+        store.activate(version)
+    assert store.current() == current